@@ -3,7 +3,6 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from pydantic import EmailStr
 from datetime import datetime, timedelta, timezone
-from argon2 import PasswordHasher
 import jwt
 
 from app.db import get_session
@@ -11,11 +10,10 @@ from app.models import User, PaymentMethod
 from app.schemas import RegisterIn, LoginIn, TokenOut, UserOut
 from app.deps import auth_required
 from app.config import settings
+from app.passwords import hash_password, verify_password, needs_rehash
 
 router = APIRouter()
 
-ph = PasswordHasher()
-
 def create_access_token(sub: str, expires_minutes: int = None):
     expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {"sub": sub, "exp": expire}
@@ -30,7 +28,7 @@ async def register(payload: RegisterIn, session: AsyncSession = Depends(get_sess
     user = User(
         name=payload.name,
         email=str(payload.email),
-        password_hash=ph.hash(payload.password),
+        password_hash=await hash_password(payload.password),
         role="user",
         is_active=False,
     )
@@ -58,10 +56,12 @@ async def login(payload: LoginIn, session: AsyncSession = Depends(get_session)):
     user = res.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    try:
-        ph.verify(user.password_hash, payload.password)
-    except Exception:
+    if not await verify_password(user.password_hash, payload.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    # Transparently upgrade hashes made with older Argon2 parameters.
+    if needs_rehash(user.password_hash):
+        user.password_hash = await hash_password(payload.password)
+        await session.commit()
     token = create_access_token(sub=str(user.id))
     return TokenOut(access_token=token, is_active=user.is_active)
 
@@ -0,0 +1,31 @@
+"""Content-addressed memoization of engine results.
+
+A calculation is identified by the canonical JSON of its inputs plus the
+engine version, so identical payloads map to the same key no matter which
+project saved them or how the client ordered the keys. Sites backed by a
+resource data file also mix in that file's identity, so replacing the data
+changes the key; clear-sky sites keep their original keys.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict
+
+from app.cache import LRUCache
+from app.calcs import resource, solar
+from app.config import settings
+
+result_cache = LRUCache(settings.CALC_CACHE_SIZE)
+
+
+def inputs_hash(payload: Dict[str, Any]) -> str:
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256(solar.ENGINE_VERSION.encode())
+    digest.update(b"\0")
+    digest.update(canonical.encode())
+    site = solar.site_parameters(payload)
+    tag = resource.store.tag(site["lat"], site["lon"])
+    if tag is not None:
+        digest.update(b"\0")
+        digest.update(tag.encode())
+    return digest.hexdigest()
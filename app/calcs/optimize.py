@@ -0,0 +1,143 @@
+"""System-size and orientation sweep over the hourly engine.
+
+Every candidate is ``(num_panels, panel_watts, tilt, azimuth)``. The engine is
+linear in DC size up to inverter clipping, so one vectorized pass computes the
+hourly AC-per-kWdc profile for every orientation and the annual yield of any
+size follows without re-running the model:
+
+* no AC limit: ``annual = dc_kw * sum(profile)``;
+* AC limit ``A``: with the profile sorted, the hours below ``A / dc_kw`` add
+  ``dc_kw * p`` and the rest add ``A``, so a ``searchsorted`` over the prefix
+  sums prices every size for that orientation at once.
+
+For each DC size only the best orientation survives (the others are
+dominated), sizes sharing a DC rating keep the fewest panels, and the
+returned front is every size that yields more than all smaller ones.
+"""
+
+import math
+from typing import Any, Dict
+
+import numpy as np
+
+from app.calcs.solar import HOURS_PER_YEAR, _parameters, ac_per_kw_profiles
+
+MAX_SIZES = 5000
+MAX_ORIENTATIONS = 500
+OBJECTIVES = ("cover_demand_min_dc", "max_energy")
+
+
+def sweep_values(spec: Dict[str, float] | None, default: float, limit: int) -> np.ndarray:
+    """Expand ``{"start", "stop", "step"}`` (inclusive stop) to values.
+
+    The count is checked against ``limit`` before anything is allocated.
+    """
+    if not spec:
+        return np.array([default], dtype=np.float64)
+    start, stop = float(spec["start"]), float(spec["stop"])
+    step = float(spec.get("step") or 1.0)
+    if not all(math.isfinite(v) for v in (start, stop, step)) or step <= 0:
+        raise ValueError("Sweep start, stop and step must be finite, with a positive step")
+    if stop < start:
+        raise ValueError("Sweep stop must not be below start")
+    count = math.floor((stop - start) / step + 1e-9) + 1
+    if count > limit:
+        raise ValueError(f"Sweep range has more than {limit} values")
+    return start + step * np.arange(count, dtype=np.float64)
+
+
+def _annual_yield(profiles: np.ndarray, dc_kw: np.ndarray, ac_kw: float) -> np.ndarray:
+    """Annual AC kWh for each (size, orientation) pair, shape ``(sizes, orientations)``."""
+    if ac_kw <= 0:
+        return np.outer(dc_kw, profiles.sum(axis=1))
+    ordered = np.sort(profiles, axis=1)
+    prefix = np.concatenate(
+        [np.zeros((ordered.shape[0], 1)), np.cumsum(ordered, axis=1)], axis=1
+    )
+    thresholds = ac_kw / np.maximum(dc_kw, 1e-12)
+    energy = np.empty((dc_kw.size, ordered.shape[0]))
+    for k in range(ordered.shape[0]):
+        below = np.searchsorted(ordered[k], thresholds, side="left")
+        energy[:, k] = dc_kw * prefix[k, below] + ac_kw * (HOURS_PER_YEAR - below)
+    return energy
+
+
+def optimize(inputs: Dict[str, Any], sweep: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluate the sweep grid and return the best candidate and Pareto front."""
+    params = _parameters(inputs)
+    objective = sweep.get("objective") or "cover_demand_min_dc"
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}")
+
+    panels = np.unique(np.round(sweep_values(sweep.get("num_panels"), float(params["num_panels"]), MAX_SIZES)))
+    panels = panels[panels > 0]
+    watts = np.unique(sweep_values(sweep.get("panel_watts"), params["panel_watts"], MAX_SIZES))
+    watts = watts[watts > 0]
+    tilts = np.unique(np.clip(sweep_values(sweep.get("tilt"), params["tilt"], MAX_ORIENTATIONS), 0.0, 90.0))
+    azimuths = np.unique(np.mod(sweep_values(sweep.get("azimuth"), params["azimuth"], MAX_ORIENTATIONS), 360.0))
+    if panels.size == 0 or watts.size == 0:
+        raise ValueError("num_panels and panel_watts must include positive values")
+    if panels.size * watts.size > MAX_SIZES:
+        raise ValueError(f"Sweep has more than {MAX_SIZES} system sizes")
+    if tilts.size * azimuths.size > MAX_ORIENTATIONS:
+        raise ValueError(f"Sweep has more than {MAX_ORIENTATIONS} orientations")
+
+    # Distinct DC ratings, each keeping the (num_panels, panel_watts) with fewest panels.
+    grid_panels, grid_watts = (a.ravel() for a in np.meshgrid(panels, watts, indexing="ij"))
+    grid_dc = np.round(grid_panels * grid_watts / 1000.0, 6)
+    order = np.lexsort((grid_panels, grid_dc))
+    dc_kw, first = np.unique(grid_dc[order], return_index=True)
+    size_panels, size_watts = grid_panels[order][first], grid_watts[order][first]
+
+    tilt_grid, azimuth_grid = (a.ravel() for a in np.meshgrid(tilts, azimuths, indexing="ij"))
+    profiles = ac_per_kw_profiles(params, tilt_grid, azimuth_grid)
+    energy = _annual_yield(profiles, dc_kw, params["ac_kw"])
+    best_orientation = np.argmax(energy, axis=1)
+    best_energy = energy[np.arange(dc_kw.size), best_orientation]
+
+    # Pareto front on (min dc_kw, max annual kWh); dc_kw is already ascending.
+    running_max = np.maximum.accumulate(best_energy)
+    improves = np.empty(dc_kw.size, dtype=bool)
+    improves[0] = True
+    improves[1:] = best_energy[1:] > running_max[:-1] + 1e-9
+    front_idx = np.flatnonzero(improves)
+
+    demand = float((inputs.get("demand") or {}).get("annual_kwh") or 0)
+    target = float(sweep.get("target_kwh") or demand or 0)
+
+    def candidate(i: int) -> Dict[str, Any]:
+        k = best_orientation[i]
+        annual = float(best_energy[i])
+        return {
+            "num_panels": int(size_panels[i]),
+            "panel_watts": float(size_watts[i]),
+            "dc_kw": round(float(dc_kw[i]), 3),
+            "tilt": float(tilt_grid[k]),
+            "azimuth": float(azimuth_grid[k]),
+            "annual_kwh": round(annual, 0),
+            "kwh_per_kwdc": round(annual / float(dc_kw[i]), 1),
+            "coverage_pct": round(100.0 * annual / target, 1) if target > 0 else None,
+        }
+
+    if objective == "max_energy":
+        best = int(front_idx[-1])
+        meets_target = target <= 0 or best_energy[best] >= target
+    else:
+        if target <= 0:
+            raise ValueError("cover_demand_min_dc needs target_kwh or demand.annual_kwh")
+        covering = front_idx[best_energy[front_idx] >= target]
+        meets_target = covering.size > 0
+        best = int(covering[0] if meets_target else front_idx[-1])
+
+    return {
+        "objective": objective,
+        "target_kwh": target or None,
+        "meets_target": bool(meets_target),
+        "evaluated": {
+            "sizes": int(dc_kw.size),
+            "orientations": int(tilt_grid.size),
+            "candidates": int(panels.size * watts.size * tilt_grid.size),
+        },
+        "best": candidate(best),
+        "pareto_front": [candidate(int(i)) for i in front_idx],
+    }
@@ -0,0 +1,142 @@
+"""Hourly solar resource data keyed by location grid cell.
+
+Sites are snapped to a ``RESOURCE_CELL_DEG`` grid. Each cell has one ``.npy``
+file in ``RESOURCE_DIR`` holding a ``(4, 8760)`` little-endian float32 array:
+GHI, DNI and DHI in W/m2 and ambient temperature in deg C, hour 0 being
+Jan 1 00:00-01:00 local mean solar time (the engine's clock). Files are
+opened with ``mmap_mode="r"``, so the OS page cache is shared across worker
+processes. Open cells live in a bounded LRU, so every project in the same
+city reuses one mapping instead of reading the data again.
+
+Cells without a file fall back to the engine's clear-sky model. Replacing a
+file takes effect for cells not currently cached; call ``store.clear()`` (or
+restart) to pick it up everywhere. ``synthetic_year`` and the
+``python -m app.calcs.resource`` command write deterministic offline data for
+tests and local development.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from app.cache import LRUCache
+from app.config import settings
+
+FIELDS = ("ghi", "dni", "dhi", "temp_air")
+DTYPE = np.dtype("<f4")
+HOURS = 8760
+
+
+class Resource(NamedTuple):
+    tag: str
+    data: np.ndarray  # (4, 8760) float32, usually a read-only memmap
+
+    @property
+    def ghi(self) -> np.ndarray:
+        return self.data[0]
+
+    @property
+    def dni(self) -> np.ndarray:
+        return self.data[1]
+
+    @property
+    def dhi(self) -> np.ndarray:
+        return self.data[2]
+
+    @property
+    def temp_air(self) -> np.ndarray:
+        return self.data[3]
+
+
+class ResourceStore:
+    def __init__(self, directory: str | Path, cell_deg: float, cache_size: int):
+        self.directory = Path(directory)
+        self.cell_deg = cell_deg
+        self._cache = LRUCache(cache_size)
+        self.loads = 0
+
+    def cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def path(self, cell: tuple[int, int]) -> Path:
+        return self.directory / f"cell_{self.cell_deg:g}_{cell[0]}_{cell[1]}.npy"
+
+    def get(self, lat: float, lon: float) -> Resource | None:
+        cell = self.cell(lat, lon)
+        cached = self._cache.get(cell)
+        if cached is not None:
+            return cached
+        path = self.path(cell)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None  # misses are not cached, so new files are seen at once
+        data = np.load(path, mmap_mode="r")
+        if data.shape != (len(FIELDS), HOURS) or data.dtype != DTYPE:
+            raise ValueError(f"{path} must hold a {(len(FIELDS), HOURS)} {DTYPE} array")
+        resource = Resource(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}", data)
+        self.loads += 1
+        self._cache.put(cell, resource)
+        return resource
+
+    def tag(self, lat: float, lon: float) -> str | None:
+        """Identity of the data behind a site, for memo keys; ``None`` for clear sky."""
+        resource = self.get(lat, lon)
+        return resource.tag if resource is not None else None
+
+    def write(self, lat: float, lon: float, data: np.ndarray) -> Path:
+        data = np.ascontiguousarray(data, dtype=DTYPE)
+        if data.shape != (len(FIELDS), HOURS):
+            raise ValueError(f"resource data must have shape {(len(FIELDS), HOURS)}")
+        path = self.path(self.cell(lat, lon))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_suffix(".npy.part")
+        with open(partial, "wb") as fp:
+            np.save(fp, data)
+        os.replace(partial, path)
+        self._cache.pop(self.cell(lat, lon))
+        return path
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "loads": self.loads}
+
+
+def synthetic_year(lat: float, lon: float, seed: int | None = None) -> np.ndarray:
+    """Clear-sky irradiance thinned by seeded daily cloud cover, plus temperature."""
+    from app.calcs import solar
+
+    rng = np.random.default_rng(seed if seed is not None else abs(hash((round(lat, 4), round(lon, 4)))) % 2**32)
+    cos_z, _, _ = solar._sun_geometry(lat)
+    dni, dhi, _ = solar._clear_sky(cos_z)
+    cloud = np.repeat(rng.uniform(0.35, 1.0, HOURS // 24), 24)
+    dni = dni * cloud
+    dhi = dhi * (1.0 + 1.5 * (1.0 - cloud))  # clouds scatter beam into diffuse
+    ghi = dni * np.maximum(cos_z, 0.0) + dhi
+    temp = solar._ambient_temperature(lat) + rng.normal(0.0, 1.5, HOURS)
+    return np.stack([ghi, dni, dhi, temp]).astype(DTYPE)
+
+
+store = ResourceStore(settings.RESOURCE_DIR, settings.RESOURCE_CELL_DEG, settings.RESOURCE_CACHE_SIZE)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write synthetic resource files for grid cells")
+    parser.add_argument("sites", nargs="+", help="lat,lon pairs, e.g. 32.08,34.78")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    for site in args.sites:
+        lat, lon = (float(v) for v in site.split(","))
+        print(store.write(lat, lon, synthetic_year(lat, lon, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
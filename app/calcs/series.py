@@ -0,0 +1,79 @@
+"""Binary storage for the hourly production series.
+
+``solar.calculate`` returns ``hourly_kwh`` as a float32 NumPy array. It is
+stored in ``Calculation.hourly_series`` as raw little-endian float32 bytes,
+optionally zlib-compressed (``SERIES_COMPRESSION``), and only the summary
+goes to ``results_json``. Readers get the array back with ``np.frombuffer``
+(no per-value Python objects), and the series endpoint can serve the stored
+bytes as-is.
+"""
+
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.calcs.solar import HOURS_PER_YEAR, MONTH_START_HOURS
+
+DTYPE = np.dtype("<f4")
+SERIES_KEY = "hourly_kwh"
+RAW = "f4le"
+ZLIB = "f4le+zlib"
+
+
+def encode(values: np.ndarray, compression: str = "none") -> Tuple[bytes, str]:
+    raw = np.ascontiguousarray(values, dtype=DTYPE).tobytes()
+    if compression == "zlib":
+        return zlib.compress(raw, 6), ZLIB
+    return raw, RAW
+
+
+def decode(blob: bytes, encoding: str) -> np.ndarray:
+    if encoding == ZLIB:
+        blob = zlib.decompress(blob)
+    elif encoding != RAW:
+        raise ValueError(f"Unknown series encoding {encoding!r}")
+    return np.frombuffer(blob, dtype=DTYPE)
+
+
+def split(results: Dict[str, Any], compression: str = "none") -> Dict[str, Any]:
+    """Column values for a Calculation row: summary JSON plus the encoded series."""
+    summary = {key: value for key, value in results.items() if key != SERIES_KEY}
+    hourly = results.get(SERIES_KEY)
+    if hourly is None:
+        return {"results_json": summary, "hourly_series": None, "series_encoding": None}
+    blob, encoding = encode(hourly, compression)
+    return {"results_json": summary, "hourly_series": blob, "series_encoding": encoding}
+
+
+def hourly(calc) -> Optional[np.ndarray]:
+    """The stored hourly series of a Calculation, including rows from before binary storage."""
+    if calc.hourly_series is not None:
+        return decode(calc.hourly_series, calc.series_encoding)
+    legacy = (calc.results_json or {}).get(SERIES_KEY)
+    if legacy is None:
+        return None
+    return np.asarray(legacy, dtype=DTYPE)
+
+
+def join(calc) -> Dict[str, Any]:
+    """Inverse of ``split``: engine-shaped results rebuilt from a stored row."""
+    results = dict(calc.results_json or {})
+    values = hourly(calc)
+    if values is not None:
+        results[SERIES_KEY] = values
+    return results
+
+
+def downsample(values: np.ndarray, resolution: str) -> np.ndarray:
+    """Sum an 8760-hour series to days (365) or months (12)."""
+    if resolution == "hourly":
+        return values
+    if values.size != HOURS_PER_YEAR:
+        raise ValueError("Downsampling needs an 8760-hour series")
+    if resolution == "daily":
+        return values.reshape(-1, 24).sum(axis=1, dtype=np.float64)
+    if resolution == "monthly":
+        return np.add.reduceat(values, MONTH_START_HOURS, dtype=np.float64)
+    raise ValueError(f"Unknown resolution {resolution!r}")
+
@@ -2,15 +2,262 @@
 
 Implement functions that take a validated inputs dict and return results dicts.
 Keep it deterministic and side-effect free.
+
+The production model below runs a full 8760-hour year as NumPy arrays: solar
+position, clear-sky irradiance, plane-of-array transposition and temperature
+derated DC/AC output are all computed in one vectorized pass. Hours are in
+local mean solar time (hour 0 is Jan 1, 00:00-01:00), which keeps the sun
+geometry independent of longitude.
+
+Irradiance and ambient temperature come from the site's resource cell (see
+``app.calcs.resource``) when a data file exists for it; otherwise the
+clear-sky model below, derated by ``site.clearness``, stands in. Sun
+geometry and the clear-sky arrays are read from per-latitude tables (see
+``app.calcs.sun_tables``); sites share the table of their
+``SUN_TABLE_LAT_STEP`` latitude bucket.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from app.calcs.resource import store as resource_store
+from app.calcs.sun_tables import SunTableStore
+from app.config import settings
+
+# Bump whenever outputs change for the same inputs; it is part of the memo key.
+ENGINE_VERSION = "hourly-3"
+
+HOURS_PER_YEAR = 8760
+DAYS_PER_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+MONTH_START_HOURS = np.cumsum((0,) + DAYS_PER_MONTH[:-1]) * 24
+
+DEFAULT_SITE = {"lat": 32.1, "lon": 34.8, "tilt": 25.0, "azimuth": 180.0}
+SOLAR_CONSTANT = 1367.0  # W/m2
+NOCT_C = 45.0
+GROUND_ALBEDO = 0.2
+
+# Mid-hour timestamps shared by every calculation.
+_HOUR = np.arange(HOURS_PER_YEAR, dtype=np.float64) + 0.5
+_DOY = np.floor(_HOUR / 24.0) + 1.0
+_HOUR_OF_DAY = _HOUR % 24.0
+
+
+def _sun_geometry(lat: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return cos(zenith) and the north/east components of sin(zenith).
+
+    Uses Spencer's series for declination and equation of time. The azimuth
+    components are measured clockwise from north so that 180 faces south.
+    """
+    b = 2.0 * np.pi * (_DOY - 1.0) / 365.0
+    decl = (
+        0.006918
+        - 0.399912 * np.cos(b)
+        + 0.070257 * np.sin(b)
+        - 0.006758 * np.cos(2 * b)
+        + 0.000907 * np.sin(2 * b)
+        - 0.002697 * np.cos(3 * b)
+        + 0.00148 * np.sin(3 * b)
+    )
+    eot_min = 229.18 * (
+        0.000075
+        + 0.001868 * np.cos(b)
+        - 0.032077 * np.sin(b)
+        - 0.014615 * np.cos(2 * b)
+        - 0.040849 * np.sin(2 * b)
+    )
+    hour_angle = np.radians(15.0 * (_HOUR_OF_DAY + eot_min / 60.0 - 12.0))
+    phi = np.radians(lat)
+    sin_d, cos_d = np.sin(decl), np.cos(decl)
+    cos_h = np.cos(hour_angle)
+    cos_z = np.sin(phi) * sin_d + np.cos(phi) * cos_d * cos_h
+    north = sin_d * np.cos(phi) - cos_d * np.sin(phi) * cos_h
+    east = -cos_d * np.sin(hour_angle)
+    return cos_z, north, east
+
+
+def _clear_sky(cos_z: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Meinel clear-sky beam with a fixed diffuse fraction; zero below horizon."""
+    up = cos_z > 0.0
+    zenith_deg = np.degrees(np.arccos(np.clip(cos_z, -1.0, 1.0)))
+    # Kasten-Young air mass; only evaluated where the sun is up.
+    air_mass = 1.0 / (
+        np.maximum(cos_z, 1e-6)
+        + 0.50572 * np.maximum(96.07995 - zenith_deg, 1e-3) ** -1.6364
+    )
+    e0 = SOLAR_CONSTANT * (1.0 + 0.033 * np.cos(2.0 * np.pi * _DOY / 365.0))
+    dni = np.where(up, e0 * 0.7 ** (air_mass ** 0.678), 0.0)
+    dhi = 0.1 * dni
+    ghi = dni * np.maximum(cos_z, 0.0) + dhi
+    return dni, dhi, ghi
+
+
+def _ambient_temperature(lat: float) -> np.ndarray:
+    """Synthetic seasonal + diurnal ambient temperature profile in deg C."""
+    abs_lat = abs(lat)
+    mean = 28.0 - 0.35 * abs_lat
+    seasonal = 0.2 * abs_lat
+    peak_doy = 200.0 if lat >= 0 else 19.0
+    return (
+        mean
+        + seasonal * np.cos(2.0 * np.pi * (_DOY - peak_doy) / 365.0)
+        + 5.0 * np.cos(2.0 * np.pi * (_HOUR_OF_DAY - 15.0) / 24.0)
+    )
+
+
+def _plane_of_array(
+    cos_z: np.ndarray,
+    north: np.ndarray,
+    east: np.ndarray,
+    dni: np.ndarray,
+    dhi: np.ndarray,
+    ghi: np.ndarray,
+    tilt: float,
+    azimuth: float,
+) -> np.ndarray:
+    """Isotropic-sky transposition of beam, diffuse and ground-reflected light."""
+    beta = np.radians(tilt)
+    gamma = np.radians(azimuth)
+    cos_aoi = (
+        cos_z * np.cos(beta)
+        + north * np.sin(beta) * np.cos(gamma)
+        + east * np.sin(beta) * np.sin(gamma)
+    )
+    beam = dni * np.maximum(cos_aoi, 0.0)
+    sky = dhi * (1.0 + np.cos(beta)) / 2.0
+    ground = ghi * GROUND_ALBEDO * (1.0 - np.cos(beta)) / 2.0
+    return beam + sky + ground
+
+
+def _build_sun_table(lat: float) -> np.ndarray:
+    cos_z, north, east = _sun_geometry(lat)
+    dni, dhi, ghi = _clear_sky(cos_z)
+    return np.stack([cos_z, north, east, dni, dhi, ghi, _ambient_temperature(lat)])
+
+
+sun_tables = SunTableStore(
+    settings.SUN_TABLE_DIR,
+    settings.SUN_TABLE_LAT_STEP,
+    settings.SUN_TABLE_CACHE_SIZE,
+    _build_sun_table,
+    ENGINE_VERSION,
+)
+
+
+def _finite(value: Any, default: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    return number if np.isfinite(number) else default
+
+
+def site_parameters(inputs: Dict[str, Any]) -> Dict[str, float]:
+    """Site geometry; ``DEFAULT_SITE`` stands in for missing or non-numeric values."""
+    raw = inputs.get("site")
+    raw = raw if isinstance(raw, dict) else {}
+    site = {key: _finite(raw.get(key), default) for key, default in DEFAULT_SITE.items()}
+    if not -90.0 <= site["lat"] <= 90.0:
+        site["lat"] = DEFAULT_SITE["lat"]
+    site["clearness"] = max(0.0, min(1.0, _finite(raw.get("clearness"), 0.75)))
+    return site
+
+
+def _number(section: Dict[str, Any], name: str, key: str, default: float) -> float:
+    value = section.get(key)
+    if value is None or value == "":
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = float("nan")
+    if isinstance(value, bool) or not np.isfinite(number):
+        raise ValueError(f"{name}.{key} must be a number, got {value!r}")
+    return number
+
+
+def _section(inputs: Dict[str, Any], name: str) -> Dict[str, Any]:
+    section = inputs.get(name)
+    if section is None:
+        return {}
+    if not isinstance(section, dict):
+        raise ValueError(f"{name} must be an object")
+    return section
+
+
+def _parameters(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Engine parameters; raises ``ValueError`` for unusable pv/inverter values."""
+    site = site_parameters(inputs)
+    pv = _section(inputs, "pv")
+    inverter = _section(inputs, "inverter")
+
+    panel_watts = _number(pv, "pv", "panel_watts", 0.0)
+    num_panels = int(_number(pv, "pv", "num_panels", 0.0))
+    losses_pct = _number(pv, "pv", "losses_pct", 14.0)
+    inv_eff = _number(inverter, "inverter", "efficiency_pct", 97.0)
+    return {
+        "lat": site["lat"],
+        "lon": site["lon"],
+        "tilt": site["tilt"],
+        "azimuth": site["azimuth"],
+        "clearness": site["clearness"],
+        "panel_watts": panel_watts,
+        "num_panels": num_panels,
+        "dc_kw": (panel_watts * num_panels) / 1000.0,
+        "temp_coeff": _number(pv, "pv", "temp_coeff_pct_per_c", -0.37) / 100.0,
+        "system_losses": max(0.0, min(0.5, losses_pct / 100.0)),  # clamp 0–50%
+        "inverter_eff": max(0.80, min(0.995, inv_eff / 100.0)),   # clamp 80–99.5%
+        "ac_kw": _number(inverter, "inverter", "ac_kw", 0.0),
+    }
+
+
+def ac_per_kw_profiles(params: Dict[str, Any], tilt, azimuth) -> np.ndarray:
+    """Hourly AC output per kWdc before inverter clipping.
+
+    ``tilt`` and ``azimuth`` may be scalars or equally shaped arrays of
+    orientations; the result then has one 8760-hour row per orientation.
+    """
+    tilt = np.asarray(tilt, dtype=np.float64)[..., None]
+    azimuth = np.asarray(azimuth, dtype=np.float64)[..., None]
+    sun = sun_tables.get(params["lat"])
+    resource = resource_store.get(params["lat"], params["lon"])
+    if resource is None:
+        poa = params["clearness"] * _plane_of_array(
+            sun.cos_z, sun.north, sun.east, sun.dni, sun.dhi, sun.ghi, tilt, azimuth
+        )
+        t_air = sun.temp_air
+    else:
+        poa = _plane_of_array(sun.cos_z, sun.north, sun.east, resource.dni, resource.dhi, resource.ghi, tilt, azimuth)
+        t_air = resource.temp_air
+    t_cell = t_air + (NOCT_C - 20.0) / 800.0 * poa
+    derate = (1.0 + params["temp_coeff"] * (t_cell - 25.0)) * (1.0 - params["system_losses"]) * params["inverter_eff"]
+    return np.maximum(poa / 1000.0 * derate, 0.0)
+
+
+def simulate(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the hourly model and return NumPy arrays plus scalar parameters."""
+    params = _parameters(inputs)
+    dc_kw = params["dc_kw"]
+    ac_per_kw = ac_per_kw_profiles(params, params["tilt"], params["azimuth"])
+    ac = ac_per_kw * dc_kw
+    if params["ac_kw"] > 0:
+        ac = np.minimum(ac, params["ac_kw"])
+
+    return {
+        "dc_kw": dc_kw,
+        "specific_yield": float(ac_per_kw.sum()),
+        "hourly_ac_kwh": ac,
+        "monthly_ac_kwh": np.add.reduceat(ac, MONTH_START_HOURS),
+    }
+
 
 def calculate(inputs: Dict[str, Any]) -> Dict[str, Any]:
     """Entry point used by the API.
 
-    Replace the placeholder math below with your real logic extracted from Excel.
-    Keep keys stable so the frontend can rely on them.
+    Swap ``simulate`` for your real logic extracted from Excel when it lands.
+    Keep keys stable so the frontend can rely on them; ``monthly_kwh`` has 12
+    entries and ``hourly_kwh`` is an 8760-value float32 array, stored apart
+    from the JSON summary (see ``app.calcs.series``).
     """
     # Example expected inputs (adapt as needed):
     # inputs = {
@@ -20,25 +267,35 @@ def calculate(inputs: Dict[str, Any]) -> Dict[str, Any]:
     #   "inverter": {"efficiency_pct": 97}
     # }
 
-    panel_watts = float(inputs.get("pv", {}).get("panel_watts", 0))
-    num_panels = int(inputs.get("pv", {}).get("num_panels", 0))
-    losses_pct = float(inputs.get("pv", {}).get("losses_pct", 14))
-    inv_eff = float(inputs.get("inverter", {}).get("efficiency_pct", 97))
-
-    dc_kw = (panel_watts * num_panels) / 1000.0
-    system_losses = max(0.0, min(0.5, losses_pct / 100.0))  # clamp 0–50%
-    inverter_eff = max(0.80, min(0.995, inv_eff / 100.0))   # clamp 80–99.5%
-
-    # Placeholder production estimate: 1,600 kWh per kWdc per year adjusted by losses and inverter eff.
-    kwh_per_kwdc = 1600.0 * (1.0 - system_losses) * inverter_eff
-    est_annual_kwh = dc_kw * kwh_per_kwdc
+    sim = simulate(inputs)
+    dc_kw = sim["dc_kw"]
+    est_annual_kwh = float(sim["hourly_ac_kwh"].sum())
+    kwh_per_kwdc = est_annual_kwh / dc_kw if dc_kw > 0 else sim["specific_yield"]
 
     return {
         "dc_kw": round(dc_kw, 3),
         "kwh_per_kwdc": round(kwh_per_kwdc, 1),
         "est_annual_kwh": round(est_annual_kwh, 0),
+        "monthly_kwh": np.round(sim["monthly_ac_kwh"], 1).tolist(),
+        "hourly_kwh": sim["hourly_ac_kwh"].astype(np.float32),
         "notes": [
-            "Replace placeholder with Excel-derived formulas.",
-            "Maintain deterministic outputs for testing."
+            "Hourly clear-sky model derated by site clearness; replace with measured resource data.",
+            "Hours are local mean solar time; outputs are deterministic for testing.",
         ],
     }
+
+
+def calculate_many(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run ``calculate`` over several inputs in one executor job."""
+    return [calculate(inputs) for inputs in batch]
+
+
+def calculate_each(batch: List[Dict[str, Any]]) -> List[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """Like ``calculate_many``, but one bad input yields ``(None, error)`` instead of failing the job."""
+    out: List[Tuple[Optional[Dict[str, Any]], Optional[str]]] = []
+    for inputs in batch:
+        try:
+            out.append((calculate(inputs), None))
+        except Exception as exc:  # reported per project by the caller
+            out.append((None, str(exc) if isinstance(exc, ValueError) else f"{type(exc).__name__}: {exc}"))
+    return out
@@ -0,0 +1,121 @@
+"""Per-latitude sun-position and clear-sky tables.
+
+Everything the engine derives from latitude and time alone (cos zenith, the
+north/east components of the sun vector, clear-sky DNI/DHI/GHI and the
+synthetic ambient temperature) is computed once per latitude bucket of
+``SUN_TABLE_LAT_STEP`` degrees (0.1 by default: about 11 km, so a city
+shares one table; annual yield moves by at most ~0.1% at 60 deg latitude).
+Tables are built lazily on first use and saved as float32 ``.npy`` (245 KB
+each) in ``SUN_TABLE_DIR`` (written to a temp file, then renamed, so
+concurrent workers never see a partial file). Every process then memory-maps
+the same file and keeps it in a small LRU, so a calculation does no
+trigonometry over the 8760-hour arrays. An empty ``SUN_TABLE_DIR`` keeps
+tables in memory only.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from app.cache import LRUCache
+
+ROWS = ("cos_z", "north", "east", "dni", "dhi", "ghi", "temp_air")
+
+
+class SunTable(NamedTuple):
+    lat: float
+    data: np.ndarray  # (len(ROWS), 8760) float32
+
+    @property
+    def cos_z(self) -> np.ndarray:
+        return self.data[0]
+
+    @property
+    def north(self) -> np.ndarray:
+        return self.data[1]
+
+    @property
+    def east(self) -> np.ndarray:
+        return self.data[2]
+
+    @property
+    def dni(self) -> np.ndarray:
+        return self.data[3]
+
+    @property
+    def dhi(self) -> np.ndarray:
+        return self.data[4]
+
+    @property
+    def ghi(self) -> np.ndarray:
+        return self.data[5]
+
+    @property
+    def temp_air(self) -> np.ndarray:
+        return self.data[6]
+
+
+class SunTableStore:
+    def __init__(
+        self,
+        directory: str,
+        lat_step: float,
+        cache_size: int,
+        builder: Callable[[float], np.ndarray],
+        version: str,
+    ):
+        self.directory = Path(directory) if directory else None
+        self.lat_step = lat_step
+        self.builder = builder
+        self.version = version
+        self._cache = LRUCache(cache_size)
+        self.builds = 0
+        self.maps = 0
+
+    def bucket(self, lat: float) -> int:
+        return round(lat / self.lat_step)
+
+    def path(self, bucket: int) -> Path:
+        return self.directory / f"sun_{self.version}_{self.lat_step:g}_{bucket}.npy"
+
+    def get(self, lat: float) -> SunTable:
+        bucket = self.bucket(lat)
+        table = self._cache.get(bucket)
+        if table is not None:
+            return table
+        bucket_lat = bucket * self.lat_step
+        data = None
+        if self.directory is not None:
+            path = self.path(bucket)
+            try:
+                data = np.load(path, mmap_mode="r")
+                self.maps += 1
+            except (FileNotFoundError, ValueError):
+                data = None
+        if data is None:
+            data = np.ascontiguousarray(self.builder(bucket_lat), dtype=np.float32)
+            self.builds += 1
+            if self.directory is not None:
+                data = self._save(self.path(bucket), data)
+        table = SunTable(bucket_lat, data)
+        self._cache.put(bucket, table)
+        return table
+
+    def _save(self, path: Path, data: np.ndarray) -> np.ndarray:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=path.parent, suffix=".npy.part")
+        with os.fdopen(fd, "wb") as fp:
+            np.save(fp, data)
+        os.replace(partial, path)
+        return np.load(path, mmap_mode="r")
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "builds": self.builds, "maps": self.maps}
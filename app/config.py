@@ -7,10 +7,81 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ALGORITHM: str = "HS256"
     DATABASE_URL: str = "sqlite+aiosqlite:///./dev.db"
+    # Connection pool (ignored for SQLite). Size against uvicorn workers:
+    # each worker holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections.
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # psycopg server-side prepared statements; disable behind PgBouncer.
+    DB_PREPARED_STATEMENTS: bool = True
+    DB_PREPARE_THRESHOLD: int = 5
+    # Per-route latency/query histograms (GET /metrics) and the Server-Timing header.
+    REQUEST_METRICS: bool = True
+    SERVER_TIMING: bool = True
+    # Bearer token for scrapers of /metrics*; admins can use their own login instead.
+    METRICS_TOKEN: str = ""
+    # orjson default response class and single-pass list serialization.
+    FAST_JSON: bool = False
     ALLOWED_ORIGINS: str = "http://localhost:3000"
     STRIPE_SECRET_KEY: str = ""
     STRIPE_WEBHOOK_SECRET: str = ""
     FRONTEND_DOMAIN: str = "http://localhost:3000"
+    STRIPE_EVENTS_BATCH_SIZE: int = 100
+    STRIPE_EVENTS_POLL_SECONDS: float = 5.0
+    STRIPE_EVENTS_MAX_ATTEMPTS: int = 5
+    STRIPE_EVENTS_STALE_SECONDS: float = 300.0
+    # Entries are a JSON summary plus a 35 KB float32 hourly array.
+    CALC_CACHE_SIZE: int = 512
+    # Hourly irradiance/temperature files per lat/lon grid cell (app/calcs/resource.py).
+    RESOURCE_DIR: str = "./resource"
+    RESOURCE_CELL_DEG: float = 0.25
+    RESOURCE_CACHE_SIZE: int = 64
+    # Per-latitude sun-position/clear-sky tables (app/calcs/sun_tables.py);
+    # an empty SUN_TABLE_DIR keeps them in memory only.
+    SUN_TABLE_DIR: str = "./sun_tables"
+    SUN_TABLE_LAT_STEP: float = 0.1
+    SUN_TABLE_CACHE_SIZE: int = 128
+    # Stored hourly series: "none" (raw float32) or "zlib".
+    SERIES_COMPRESSION: str = "zlib"
+    # "full" stores every version of inputs/results; "delta" stores a snapshot
+    # every VERSION_SNAPSHOT_INTERVAL versions and JSON patches in between.
+    VERSION_STORAGE: str = "full"
+    VERSION_SNAPSHOT_INTERVAL: int = 20
+    HISTORY_CACHE_SIZE: int = 256
+    # Rows fetched per server-side cursor round trip by GET /projects/export.
+    EXPORT_BATCH_SIZE: int = 2000
+    # POST /projects/import: valid rows inserted per batch, and rows read per upload.
+    IMPORT_BATCH_SIZE: int = 500
+    IMPORT_MAX_ROWS: int = 10000
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 16
+    PASSWORD_HASH_TIMEOUT_SECONDS: float = 10.0
+    REPORTS_DIR: str = "./reports"
+    REPORT_WORKERS: int = 2
+    REPORT_MAX_ATTEMPTS: int = 3
+    REPORT_TIMEOUT_SECONDS: float = 120.0
+    REPORT_POLL_SECONDS: float = 5.0
+    # Reports stuck in "rendering" this long (crashed worker) are picked up again.
+    REPORT_STALE_SECONDS: float = 600.0
+    NOTIFY_BATCH_SIZE: int = 500
+    NOTIFY_POLL_SECONDS: float = 5.0
+    NOTIFY_MAX_ATTEMPTS: int = 5
+    NOTIFY_RETRY_SECONDS: float = 60.0
+    NOTIFY_STALE_SECONDS: float = 300.0
+    EVENTS_QUEUE_SIZE: int = 100
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    USER_CACHE_SIZE: int = 4096
+    USER_CACHE_TTL_SECONDS: float = 30.0
+    # Where solar.calculate runs: "inline", "thread" or "process".
+    CALC_EXECUTOR: str = "thread"
+    CALC_MAX_WORKERS: int = 2
+    CALC_MAX_QUEUE: int = 32
+    CALC_TIMEOUT_SECONDS: float = 30.0
 
     class Config:
         env_file = ".env"
@@ -1,11 +1,119 @@
+import time
+
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.instrumentation import record_query
+
+
+class PoolStats:
+    """Counters fed by pool events; read through pool_status()."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checked_out = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that also measures how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+
+def engine_options(url: str) -> dict:
+    options = {"future": True, "echo": False}
+    if url.startswith("sqlite"):
+        # SQLite keeps SQLAlchemy's default NullPool/StaticPool.
+        return options
+    options.update(
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    if "+psycopg" in url:
+        # Server-side prepared statements break behind PgBouncer in transaction mode.
+        threshold = settings.DB_PREPARE_THRESHOLD if settings.DB_PREPARED_STATEMENTS else None
+        options["connect_args"] = {"prepare_threshold": threshold}
+    return options
+
 
-engine = create_async_engine(settings.normalized_db_url(), future=True, echo=False)
+engine = create_async_engine(settings.normalized_db_url(), **engine_options(settings.normalized_db_url()))
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 Base = declarative_base()
 
+
+@event.listens_for(engine.sync_engine.pool, "connect")
+def _on_connect(dbapi_connection, connection_record):
+    pool_stats.connects += 1
+
+
+@event.listens_for(engine.sync_engine.pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_stats.checkouts += 1
+    pool_stats.checked_out += 1
+
+
+@event.listens_for(engine.sync_engine.pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    pool_stats.checked_out -= 1
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Attributed to the HTTP request running in this context, if any.
+    record_query(time.perf_counter() - context._query_started)
+
+
+def pool_status() -> dict:
+    pool = engine.sync_engine.pool
+    status = {
+        "pool_class": type(pool).__name__,
+        "checked_out": pool_stats.checked_out,
+        "checkouts": pool_stats.checkouts,
+        "connects": pool_stats.connects,
+        "timeouts": pool_stats.timeouts,
+        "wait_seconds_total": round(pool_stats.wait_seconds_total, 6),
+        "wait_seconds_max": round(pool_stats.wait_seconds_max, 6),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    return status
+
+
 async def init_db():
     # Dev convenience: auto-create tables. Replace with Alembic in prod.
     from app import models  # noqa: F401
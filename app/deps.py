@@ -1,25 +1,62 @@
+import hmac
+import time
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy import select
+from sqlalchemy import event, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 import jwt
 
+from app.cache import TTLCache
 from app.config import settings
 from app.db import get_session
 from app.models import User
 
 bearer = HTTPBearer(auto_error=False)
 
+# Roles allowed to read /metrics* with their own login.
+METRICS_ROLES = frozenset({"admin"})
 
-async def get_current_user(
-    creds: HTTPAuthorizationCredentials | None = Depends(bearer),
-    session: AsyncSession = Depends(get_session),
-) -> User:
-    if creds is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token"
-        )
-    token = creds.credentials
+# Per-process caches: token -> user id, and user id -> detached User snapshot.
+# Role/activation changes evict the snapshot on commit (see listeners below);
+# other workers converge within USER_CACHE_TTL_SECONDS.
+token_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.pop(user_id)
+
+
+def _snapshot(user: User) -> User:
+    copy = User(**{col.key: getattr(user, col.key) for col in User.__table__.columns})
+    make_transient_to_detached(copy)
+    return copy
+
+
+@event.listens_for(User.is_active, "set")
+@event.listens_for(User.role, "set")
+def _mark_user_stale(target, value, oldvalue, initiator):
+    if target.id is None or value == oldvalue:
+        return
+    session = object_session(target)
+    if session is None:
+        invalidate_user(target.id)
+    else:
+        session.info.setdefault("stale_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_stale_users(session):
+    for user_id in session.info.pop("stale_user_ids", ()):
+        invalidate_user(user_id)
+
+
+def _decode_user_id(token: str) -> int:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
@@ -29,6 +66,26 @@ async def get_current_user(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
+    # Never cache a token past its own expiry.
+    exp = payload.get("exp")
+    ttl = float(exp) - time.time() if exp is not None else None
+    token_cache.put(token, user_id, ttl=ttl)
+    return user_id
+
+
+async def get_current_user(
+    creds: HTTPAuthorizationCredentials | None = Depends(bearer),
+    session: AsyncSession = Depends(get_session),
+) -> User:
+    if creds is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token"
+        )
+    user_id = _decode_user_id(creds.credentials)
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        # Attach a per-request copy without touching the database.
+        return await session.merge(cached, load=False)
     user = (
         await session.execute(select(User).where(User.id == user_id))
     ).scalar_one_or_none()
@@ -36,9 +93,18 @@ async def get_current_user(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
         )
+    user_cache.put(user_id, _snapshot(user))
     return user
 
 
+def cache_stats() -> dict[str, dict[str, int]]:
+    """Counters for the auth caches; user hits are SELECTs the DB never saw."""
+    return {
+        "tokens": token_cache.stats(),
+        "users": {**user_cache.stats(), "db_queries_saved": user_cache.hits},
+    }
+
+
 async def auth_required(user: User = Depends(get_current_user)) -> User:
     return user
 
@@ -50,3 +116,17 @@ async def active_user_required(user: User = Depends(get_current_user)) -> User:
             detail="Payment required",
         )
     return user
+
+
+async def metrics_access(
+    creds: HTTPAuthorizationCredentials | None = Depends(bearer),
+    session: AsyncSession = Depends(get_session),
+) -> None:
+    """Scrapers send ``METRICS_TOKEN`` as a bearer token; people need an admin login."""
+    if creds is not None and settings.METRICS_TOKEN and hmac.compare_digest(
+        creds.credentials.encode(), settings.METRICS_TOKEN.encode()
+    ):
+        return
+    user = await get_current_user(creds, session)
+    if user.role not in METRICS_ROLES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
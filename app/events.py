@@ -0,0 +1,100 @@
+"""In-process fan-out hub for server-sent events.
+
+Producers call ``hub.publish(channel, event, data)`` from the event loop
+(request handlers and background workers). Each connected client holds one
+bounded queue per subscription, so idle clients cost a parked coroutine and
+no database polling. A client that falls behind drops events and receives a
+``lagged`` event telling it to refetch. The hub is per worker process; events
+published in one uvicorn worker are not seen by clients of another.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from app.config import settings
+
+
+def project_channel(project_id: int) -> str:
+    return f"project:{project_id}"
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+class Subscription:
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue[tuple[int, str, dict[str, Any]]] = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def offer(self, item: tuple[int, str, dict[str, Any]]) -> bool:
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.lagged = True
+            return False
+
+    async def get(self) -> tuple[int, str, dict[str, Any]]:
+        if self.lagged:
+            self.lagged = False
+            return 0, "lagged", {}
+        return await self.queue.get()
+
+
+class EventHub:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._channels: dict[str, set[Subscription]] = defaultdict(set)
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    @contextmanager
+    def subscribe(self, *channels: str) -> Iterator[Subscription]:
+        sub = Subscription(self.queue_size)
+        for channel in channels:
+            self._channels[channel].add(sub)
+        try:
+            yield sub
+        finally:
+            for channel in channels:
+                subs = self._channels.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._channels[channel]
+
+    def publish(self, channel: str, event: str, data: dict[str, Any]) -> None:
+        subs = self._channels.get(channel)
+        if not subs:
+            return
+        item = (next(self._ids), event, data)
+        self.published += 1
+        for sub in subs:
+            if not sub.offer(item):
+                self.dropped += 1
+
+    def stats(self) -> dict[str, int]:
+        subscriptions = {sub for subs in self._channels.values() for sub in subs}
+        return {
+            "channels": len(self._channels),
+            "subscribers": len(subscriptions),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+def format_sse(event_id: int, event: str, data: dict[str, Any]) -> str:
+    payload = json.dumps(data, default=str, separators=(",", ":"))
+    prefix = f"id: {event_id}\n" if event_id else ""
+    return f"{prefix}event: {event}\ndata: {payload}\n\n"
+
+
+hub = EventHub(settings.EVENTS_QUEUE_SIZE)
@@ -0,0 +1,125 @@
+"""Bounded executors for CPU-heavy work that must stay off the event loop.
+
+Each executor runs jobs inline, in a thread pool or in a process pool, admits
+at most ``max_workers + max_queue`` jobs at once and gives every job a
+deadline. Callers ``await run(fn, *args)``; saturation raises
+``ExecutorBusy`` and an expired deadline raises ``ExecutorTimeout``, which the
+app maps to 503 and 504 responses.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.config import settings
+
+MODES = ("inline", "thread", "process")
+
+
+class ExecutorBusy(Exception):
+    """Raised when an executor's queue is full."""
+
+
+class ExecutorTimeout(Exception):
+    """Raised when a job does not finish before its deadline."""
+
+
+class BoundedExecutor:
+    def __init__(
+        self,
+        name: str,
+        mode: str,
+        max_workers: int,
+        max_queue: int,
+        timeout: float | None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown executor mode {mode!r}; expected one of {MODES}")
+        self.name = name
+        self.mode = mode
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self._pool: Executor | None = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def start(self) -> None:
+        if self._pool is not None or self.mode == "inline":
+            return
+        if self.mode == "thread":
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=f"{self.name}-worker"
+            )
+        else:
+            # Spawn rather than fork: the parent runs an event loop and threads.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    async def shutdown(self, wait: bool = True) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await asyncio.to_thread(pool.shutdown, wait=wait, cancel_futures=True)
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._inflight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.name} queue is full")
+            self._inflight += 1
+
+    def _release(self, *_: Any) -> None:
+        with self._lock:
+            self._inflight -= 1
+            self.completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any, timeout: float | None = None) -> Any:
+        self._acquire()
+        if self.mode == "inline":
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+        self.start()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._release()
+            raise
+        # The slot is held until the job really finishes, even after a timeout,
+        # so abandoned jobs still count against the queue bound.
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError as exc:
+            self.timed_out += 1
+            raise ExecutorTimeout(f"{self.name} job exceeded its deadline") from exc
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "inflight": self._inflight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+calc_executor = BoundedExecutor(
+    "calc",
+    settings.CALC_EXECUTOR,
+    settings.CALC_MAX_WORKERS,
+    settings.CALC_MAX_QUEUE,
+    settings.CALC_TIMEOUT_SECONDS,
+)
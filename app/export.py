@@ -0,0 +1,226 @@
+"""Streaming export of calculation history as CSV or Parquet.
+
+Rows come from ``Calculation`` joined with ``Project`` and with the
+``ProjectInputs`` version the calculation was computed from,
+read through a server-side cursor (``yield_per``) ``EXPORT_BATCH_SIZE`` rows
+at a time. Each batch is flattened to fixed columns, encoded and handed to
+the response before the next one is fetched, so memory stays flat whatever
+the size of the export.
+
+Delta-stored results (see ``app.history``) are rebuilt on the fly: rows are
+ordered by project and version, so the previous document of the same project
+is at hand and only the patch is applied. Inputs are rebuilt with
+``history.load_version`` on a second session, since the streaming connection
+is busy with the cursor.
+
+Parquet needs ``pyarrow`` (pinned in requirements.txt); CSV has no extra
+dependencies.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+from typing import Any, AsyncIterator, Iterable
+
+from sqlalchemy import Select, and_, func, select
+from sqlalchemy.orm import aliased
+
+from app import history
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import Calculation, Project, ProjectInputs
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pq = None
+
+# Roles allowed to export every project of their organization (scope=org),
+# including other members' projects.
+ORG_EXPORT_ROLES = frozenset({"admin"})
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+# Flattened inputs: column name -> path into payload_json.
+INPUT_COLUMNS = {
+    "lat": ("site", "lat"),
+    "lon": ("site", "lon"),
+    "tilt": ("site", "tilt"),
+    "azimuth": ("site", "azimuth"),
+    "panel_watts": ("pv", "panel_watts"),
+    "num_panels": ("pv", "num_panels"),
+    "losses_pct": ("pv", "losses_pct"),
+    "inverter_efficiency_pct": ("inverter", "efficiency_pct"),
+    "inverter_ac_kw": ("inverter", "ac_kw"),
+    "demand_annual_kwh": ("demand", "annual_kwh"),
+}
+RESULT_COLUMNS = ("dc_kw", "kwh_per_kwdc", "est_annual_kwh")
+MONTH_COLUMNS = tuple(f"monthly_kwh_{m:02d}" for m in range(1, 13))
+KEY_COLUMNS = (
+    "project_id", "project_name", "org_id", "currency",
+    "calculation_version", "calculated_at", "inputs_version",
+)
+COLUMNS = KEY_COLUMNS + tuple(INPUT_COLUMNS) + RESULT_COLUMNS + MONTH_COLUMNS
+
+
+def parquet_available() -> bool:
+    return pa is not None
+
+
+def export_query(owner_id: int | None = None, org_id: int | None = None, project_id: int | None = None) -> Select:
+    """Calculations with their project and the inputs version current at calculation time."""
+    # Rows from before Calculation.inputs_version fall back to the latest
+    # inputs saved no later than the calculation.
+    inputs = aliased(ProjectInputs)
+    inputs_version = func.coalesce(Calculation.inputs_version, (
+        select(func.max(inputs.version))
+        .where(inputs.project_id == Calculation.project_id, inputs.created_at <= Calculation.created_at)
+        .correlate(Calculation)
+        .scalar_subquery()
+    ))
+    stmt = (
+        select(
+            Project.id, Project.name, Project.org_id, Project.currency,
+            Calculation.version, Calculation.created_at, Calculation.results_json, Calculation.delta_json,
+            ProjectInputs.version, ProjectInputs.payload_json,
+        )
+        .join(Project, Project.id == Calculation.project_id)
+        .outerjoin(ProjectInputs, and_(
+            ProjectInputs.project_id == Calculation.project_id,
+            ProjectInputs.version == inputs_version,
+        ))
+        .order_by(Calculation.project_id, Calculation.version)
+    )
+    if owner_id is not None:
+        stmt = stmt.where(Project.owner_id == owner_id)
+    if org_id is not None:
+        stmt = stmt.where(Project.org_id == org_id)
+    if project_id is not None:
+        stmt = stmt.where(Project.id == project_id)
+    return stmt
+
+
+def _dig(doc: Any, path: Iterable[str]) -> Any:
+    for key in path:
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc if not isinstance(doc, (dict, list)) else None
+
+
+def flatten(key: tuple, inputs: dict | None, results: dict | None) -> tuple:
+    inputs = inputs or {}
+    results = results or {}
+    monthly = results.get("monthly_kwh") or []
+    return (
+        key
+        + tuple(_dig(inputs, path) for path in INPUT_COLUMNS.values())
+        + tuple(results.get(name) for name in RESULT_COLUMNS)
+        + tuple(monthly[i] if i < len(monthly) else None for i in range(12))
+    )
+
+
+async def iter_batches(stmt: Select) -> AsyncIterator[list[tuple]]:
+    """Flattened rows of ``export_query``, one list per fetched batch."""
+    batch_size = max(1, settings.EXPORT_BATCH_SIZE)
+    async with AsyncSessionLocal() as session, AsyncSessionLocal() as side:
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        previous: tuple[int, int, dict] | None = None  # project_id, version, results
+        async for partition in result.partitions(batch_size):
+            rows = []
+            for (project_id, name, org_id, currency, version, created_at, results, delta,
+                 inputs_version, inputs) in partition:
+                if results is None and delta is not None:
+                    if previous and previous[:2] == (project_id, version - 1):
+                        results = history.apply_patch(previous[2], delta)
+                    else:
+                        results = await history.load_version(side, Calculation, project_id, version)
+                previous = (project_id, version, results)
+                if inputs is None and inputs_version is not None:
+                    inputs = await history.load_version(side, ProjectInputs, project_id, inputs_version)
+                key = (project_id, name, org_id, currency, version,
+                       created_at.isoformat() if created_at else None, inputs_version)
+                rows.append(flatten(key, inputs, results))
+            yield rows
+
+
+async def csv_chunks(batches: AsyncIterator[list[tuple]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    async for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file collecting Parquet bytes until the next ``drain``."""
+
+    def __init__(self):
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def _parquet_schema():
+    types = {
+        "project_id": pa.int64(), "org_id": pa.int64(), "calculation_version": pa.int64(),
+        "inputs_version": pa.int64(), "project_name": pa.string(), "currency": pa.string(),
+        "calculated_at": pa.string(),
+    }
+    return pa.schema([(name, types.get(name, pa.float64())) for name in COLUMNS])
+
+
+def _number(value: Any) -> float | None:
+    # Inputs are free-form JSON; anything that is not a number exports as null.
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+async def parquet_chunks(batches: AsyncIterator[list[tuple]]) -> AsyncIterator[bytes]:
+    """One row group per fetched batch; bytes are yielded as each group is written."""
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for rows in batches:
+            columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+            writer.write_table(pa.Table.from_arrays(
+                [
+                    pa.array(values if field.type != pa.float64() else [_number(v) for v in values], type=field.type)
+                    for values, field in zip(columns, schema)
+                ],
+                schema=schema,
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream(stmt: Select, format: str) -> AsyncIterator[bytes]:
+    batches = iter_batches(stmt)
+    return parquet_chunks(batches) if format == "parquet" else csv_chunks(batches)
@@ -0,0 +1,196 @@
+"""Snapshot + delta storage for versioned JSON documents.
+
+``ProjectInputs.payload_json`` and ``Calculation.results_json`` can be stored
+in full on every version (``VERSION_STORAGE=full``, the default) or, with
+``VERSION_STORAGE=delta``, as a full snapshot every ``VERSION_SNAPSHOT_INTERVAL``
+versions and a JSON patch (RFC 6902 ``add``/``remove``/``replace``) against
+the previous version in ``delta_json`` otherwise. A delta that would be larger
+than the document itself is stored as a snapshot instead.
+
+Reading version ``v`` loads only the rows from the nearest snapshot at or
+below ``v`` up to ``v``. Versions never change once written, so rebuilt
+documents are kept in an LRU keyed by ``(table, project_id, version)``.
+Read paths call ``hydrate`` on loaded rows, which fills the document column
+of delta rows in place; full rows are left untouched.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+from typing import Any
+
+from sqlalchemy import Select, desc, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.cache import LRUCache
+from app.config import settings
+from app.models import Calculation, ProjectInputs
+from app.versioning import MAX_ATTEMPTS, insert_versioned
+
+DOCUMENT_COLUMNS = {ProjectInputs: "payload_json", Calculation: "results_json"}
+
+history_cache = LRUCache(settings.HISTORY_CACHE_SIZE)
+
+
+def _escape(token: Any) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> list[dict[str, Any]]:
+    """JSON patch turning ``old`` into ``new``; lists that change length are replaced whole."""
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: list[dict[str, Any]] = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for idx, (a, b) in enumerate(zip(old, new)):
+            ops.extend(make_patch(a, b, f"{path}/{idx}"))
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_patch(doc: Any, patch: list[dict[str, Any]]) -> Any:
+    """Return a patched deep copy of ``doc``; the input is never modified."""
+    doc = copy.deepcopy(doc)
+    for op in patch:
+        tokens = [_unescape(t) for t in op["path"].split("/")[1:]]
+        if not tokens:
+            doc = copy.deepcopy(op["value"])
+            continue
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            idx = len(parent) if last == "-" else int(last)
+            if op["op"] == "add":
+                parent.insert(idx, copy.deepcopy(op["value"]))
+            elif op["op"] == "remove":
+                del parent[idx]
+            else:
+                parent[idx] = copy.deepcopy(op["value"])
+        elif op["op"] == "remove":
+            del parent[last]
+        else:
+            parent[last] = copy.deepcopy(op["value"])
+    return doc
+
+
+def _size(value: Any) -> int:
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+def latest(model, project_id: int) -> Select:
+    """The newest row of one project: a single backward step on ``(project_id, version)``."""
+    return select(model).where(model.project_id == project_id).order_by(desc(model.version)).limit(1)
+
+
+def latest_versions(model, project_ids: list[int]) -> Select:
+    """``(project_id, version)`` of the newest row of each project."""
+    return (
+        select(model.project_id, func.max(model.version).label("version"))
+        .where(model.project_id.in_(project_ids))
+        .group_by(model.project_id)
+    )
+
+
+async def load_version(session: AsyncSession, model, project_id: int, version: int) -> dict | None:
+    """Rebuild one version from its nearest snapshot; ``None`` if it does not exist."""
+    key = (model.__tablename__, project_id, version)
+    cached = history_cache.get(key)
+    if cached is not None:
+        return cached
+    column = getattr(model, DOCUMENT_COLUMNS[model])
+    snapshot = (
+        select(func.max(model.version))
+        .where(model.project_id == project_id, model.version <= version, column.is_not(None))
+        .scalar_subquery()
+    )
+    rows = (await session.execute(
+        select(model.version, column, model.delta_json)
+        .where(model.project_id == project_id, model.version >= snapshot, model.version <= version)
+        .order_by(model.version)
+    )).all()
+    if not rows or rows[-1][0] != version:
+        return None
+    doc = None
+    for row_version, full, delta in rows:
+        doc = full if full is not None else apply_patch(doc, delta or [])
+    history_cache.put(key, doc)
+    return doc
+
+
+async def hydrate(session: AsyncSession, model, rows: list) -> list:
+    """Fill the document column of delta-stored rows in place."""
+    name = DOCUMENT_COLUMNS[model]
+    for row in rows:
+        if row is not None and getattr(row, name) is None and row.delta_json is not None:
+            doc = await load_version(session, model, row.project_id, row.version)
+            set_committed_value(row, name, doc)
+    return rows
+
+
+async def insert_history(session: AsyncSession, model, rows: list[dict[str, Any]]) -> list:
+    """``insert_versioned`` that honours ``VERSION_STORAGE``; returns hydrated rows."""
+    if settings.VERSION_STORAGE != "delta":
+        return await insert_versioned(session, model, rows)
+    name = DOCUMENT_COLUMNS[model]
+    interval = max(1, settings.VERSION_SNAPSHOT_INTERVAL)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        latest = dict((await session.execute(
+            select(model.project_id, func.max(model.version))
+            .where(model.project_id.in_([row["project_id"] for row in rows]))
+            .group_by(model.project_id)
+        )).all())
+        values = []
+        for row in rows:
+            doc = row[name]
+            previous_version = latest.get(row["project_id"])
+            version = (previous_version or 0) + 1
+            patch = None
+            if previous_version and (version - 1) % interval:
+                previous = await load_version(session, model, row["project_id"], previous_version)
+                if previous is not None:
+                    patch = make_patch(previous, doc)
+                    if _size(patch) >= _size(doc):
+                        patch = None
+            # Explicit versions: a concurrent writer trips the unique constraint
+            # and this attempt recomputes its deltas against the new head.
+            values.append({
+                **row, "version": version,
+                name: doc if patch is None else None,
+                "delta_json": patch,
+            })
+        try:
+            inserted = list(await session.scalars(insert(model).values(values).returning(model)))
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            if attempt == MAX_ATTEMPTS:
+                raise
+            continue
+        docs = {row["project_id"]: row[name] for row in rows}
+        for obj in inserted:
+            set_committed_value(obj, name, docs[obj.project_id])
+            history_cache.put((model.__tablename__, obj.project_id, obj.version), docs[obj.project_id])
+        return inserted
+    return []
+
@@ -0,0 +1,191 @@
+"""Bulk project import from CSV or XLSX sheets.
+
+The upload is read row by row (``csv`` over the spooled upload, or
+``openpyxl`` in read-only mode for ``.xlsx``), never loaded whole. Columns
+match ``GET /projects/export``: ``name`` (or ``project_name``), ``currency``
+and the flattened input columns in ``app.export.INPUT_COLUMNS``; unknown
+columns are ignored. Each row is validated with ``ImportRow``; invalid rows
+are reported by sheet row number and skipped. Parsing and validation run in
+a worker thread, off the event loop. Valid rows are inserted
+``IMPORT_BATCH_SIZE`` at a time with one multi-row ``INSERT`` for projects and
+one for their version 1 inputs, committed per batch; a file that turns
+unreadable part way through keeps the committed batches and reports the rest
+as skipped.
+
+XLSX needs ``openpyxl`` (pinned in requirements.txt); CSV has no extra
+dependencies.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import csv
+import zipfile
+from typing import IO, Any, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.export import INPUT_COLUMNS
+from app.models import Project, ProjectInputs, User
+from app.schemas import ImportRow, ImportRowError
+
+try:
+    import openpyxl
+    from openpyxl.utils.exceptions import InvalidFileException
+except ImportError:  # pragma: no cover - optional dependency
+    openpyxl = None
+    InvalidFileException = zipfile.BadZipFile
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Unreadable uploads: bad encoding, malformed CSV, not an XLSX workbook.
+READ_ERRORS = (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, InvalidFileException)
+
+
+def xlsx_available() -> bool:
+    return openpyxl is not None
+
+
+def is_xlsx(filename: str | None, content_type: str | None) -> bool:
+    return (filename or "").lower().endswith(".xlsx") or content_type == XLSX_CONTENT_TYPE
+
+
+def _header(cells) -> list[str]:
+    return [str(cell).strip().lower().replace(" ", "_") if cell is not None else "" for cell in cells]
+
+
+def read_csv(fp: IO[bytes]) -> Iterator[tuple[int, dict[str, Any]]]:
+    """``(sheet row number, cells)`` per non-empty data row; the header is row 1."""
+    reader = csv.reader(codecs.getreader("utf-8-sig")(fp))
+    header = _header(next(reader, []))
+    for number, cells in enumerate(reader, start=2):
+        if any(cell.strip() for cell in cells):
+            yield number, dict(zip(header, cells))
+
+
+def read_xlsx(fp: IO[bytes]) -> Iterator[tuple[int, dict[str, Any]]]:
+    workbook = openpyxl.load_workbook(fp, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _header(next(rows, ()))
+        for number, cells in enumerate(rows, start=2):
+            if any(cell not in (None, "") for cell in cells):
+                yield number, dict(zip(header, cells))
+    finally:
+        workbook.close()
+
+
+def _payload(row: ImportRow) -> dict:
+    payload: dict[str, dict] = {}
+    for column, (section, key) in INPUT_COLUMNS.items():
+        value = getattr(row, column)
+        if value is not None:
+            payload.setdefault(section, {})[key] = value
+    return payload
+
+
+def _error_detail(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()
+    )
+
+
+async def _insert_batch(session: AsyncSession, user: User, batch: list[ImportRow]) -> list[int]:
+    projects = [
+        {
+            "owner_id": user.id,
+            "org_id": user.org_id,
+            "name": row.name,
+            "currency": row.currency,
+            "site_location_json": {"lat": row.lat, "lon": row.lon} if row.lat is not None and row.lon is not None else None,
+        }
+        for row in batch
+    ]
+    project_ids = list(await session.scalars(
+        insert(Project).returning(Project.id, sort_by_parameter_order=True), projects
+    ))
+    # New projects: version 1 is always a full snapshot, whatever VERSION_STORAGE says.
+    await session.execute(insert(ProjectInputs), [
+        {"project_id": project_id, "version": 1, "payload_json": _payload(row)}
+        for project_id, row in zip(project_ids, batch)
+    ])
+    await session.commit()
+    return project_ids
+
+
+class UnreadableUpload(Exception):
+    """The upload could not be read before any row was stored."""
+
+
+class _SheetBatches:
+    """Reads and validates the sheet ``size`` valid rows at a time.
+
+    ``next`` does the file parsing and row validation, so the route runs it
+    in a worker thread; calls are sequential, never concurrent.
+    """
+
+    def __init__(self, rows: Iterator[tuple[int, dict[str, Any]]], size: int, max_rows: int):
+        self.rows = rows
+        self.size = size
+        self.max_rows = max_rows
+        self.count = 0
+        self.last_row = 1
+        self.done = False
+        self.read_error: Exception | None = None
+
+    def next(self) -> tuple[list[ImportRow], list[ImportRowError]]:
+        batch: list[ImportRow] = []
+        errors: list[ImportRowError] = []
+        while len(batch) < self.size and not self.done:
+            try:
+                item = next(self.rows, None)
+            except READ_ERRORS as exc:
+                self.done = True
+                self.read_error = exc
+                errors.append(ImportRowError(
+                    row=self.last_row + 1,
+                    detail=f"Could not read the file after row {self.last_row}: {exc}; the rest was skipped",
+                ))
+                break
+            if item is None:
+                self.done = True
+                break
+            number, cells = item
+            self.last_row = number
+            self.count += 1
+            if self.count > self.max_rows:
+                self.done = True
+                errors.append(ImportRowError(
+                    row=number, detail=f"Imports are limited to {self.max_rows} rows; the rest was skipped",
+                ))
+                break
+            try:
+                batch.append(ImportRow.model_validate(cells))
+            except ValidationError as exc:
+                errors.append(ImportRowError(row=number, detail=_error_detail(exc)))
+        return batch, errors
+
+
+async def import_rows(
+    session: AsyncSession, user: User, rows: Iterator[tuple[int, dict[str, Any]]]
+) -> tuple[list[int], list[ImportRowError]]:
+    """Validate and insert rows batch by batch; returns new project ids and row errors.
+
+    A read error part way through keeps the batches already committed and is
+    reported as a row error, so the caller knows exactly what was stored.
+    ``UnreadableUpload`` is raised only when nothing was stored.
+    """
+    reader = _SheetBatches(rows, max(1, settings.IMPORT_BATCH_SIZE), settings.IMPORT_MAX_ROWS)
+    project_ids: list[int] = []
+    errors: list[ImportRowError] = []
+    while not reader.done:
+        batch, batch_errors = await asyncio.to_thread(reader.next)
+        errors += batch_errors
+        if batch:
+            project_ids += await _insert_batch(session, user, batch)
+    if reader.read_error is not None and not project_ids:
+        raise UnreadableUpload(f"Could not read the file: {reader.read_error}")
+    return project_ids, errors
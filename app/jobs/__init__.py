@@ -0,0 +1 @@
+# Background job subsystems started from the FastAPI lifespan in app.main.
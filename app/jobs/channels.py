@@ -0,0 +1,51 @@
+"""Pluggable delivery channels for the notification dispatcher.
+
+A channel receives a batch of notifications and returns the ids that failed
+with an error message. ``PermanentDeliveryError`` marks failures that must not
+be retried. The push and email backends here are local stubs that only log
+and remember what they sent; register real providers with ``register_channel``.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import deque
+
+from app.models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentDeliveryError(Exception):
+    """Delivery can never succeed (bad address, unknown channel...)."""
+
+
+class Channel:
+    name: str = ""
+
+    async def send(self, batch: list[Notification]) -> dict[int, Exception]:
+        """Deliver ``batch``; return {notification_id: error} for failures."""
+        raise NotImplementedError
+
+
+class StubChannel(Channel):
+    def __init__(self, name: str, history: int = 1000):
+        self.name = name
+        self.sent: deque[tuple[int, int, str]] = deque(maxlen=history)
+
+    async def send(self, batch: list[Notification]) -> dict[int, Exception]:
+        for notification in batch:
+            logger.info("[%s] to user %s: %s", self.name, notification.user_id, notification.title)
+            self.sent.append((notification.id, notification.user_id, notification.title))
+        return {}
+
+
+channels: dict[str, Channel] = {}
+
+
+def register_channel(channel: Channel) -> None:
+    channels[channel.name] = channel
+
+
+register_channel(StubChannel("push"))
+register_channel(StubChannel("email"))
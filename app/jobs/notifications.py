@@ -0,0 +1,223 @@
+"""Scheduled notification dispatcher.
+
+``create_notification`` stores ``next_run_at`` computed from ``schedule_json``.
+Each tick the dispatcher claims up to ``NOTIFY_BATCH_SIZE`` due rows in one
+``UPDATE ... WHERE id IN (SELECT ... LIMIT n FOR UPDATE SKIP LOCKED)`` (SQLite
+drops the lock clause and relies on its single writer plus the status
+re-check), delivers them per channel and writes the outcome back in bulk.
+The ``(status, next_run_at)`` index keeps each tick a range scan over due
+rows, however many are pending in the future. Rows written before
+``next_run_at`` existed are given their ``created_at`` and so are due at once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import select, update
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.events import hub, user_channel
+from app.jobs.channels import PermanentDeliveryError, channels
+from app.models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def compute_next_run(schedule: dict[str, Any] | None, now: datetime) -> datetime:
+    """Resolve ``{"at": ISO-8601}`` or ``{"days"/"hours"/"minutes": n}`` to naive UTC."""
+    if not schedule:
+        return now
+    if "at" in schedule:
+        at = datetime.fromisoformat(str(schedule["at"]).replace("Z", "+00:00"))
+        if at.tzinfo is not None:
+            at = at.astimezone(timezone.utc).replace(tzinfo=None)
+        return at
+    delta = timedelta(
+        days=float(schedule.get("days", 0)),
+        hours=float(schedule.get("hours", 0)),
+        minutes=float(schedule.get("minutes", 0)),
+    )
+    if delta < timedelta(0):
+        raise ValueError("schedule offsets must not be negative")
+    return now + delta
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        batch_size: int,
+        poll_seconds: float,
+        max_attempts: int,
+        retry_seconds: float,
+        stale_seconds: float,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        self.stale_seconds = stale_seconds
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.ticks = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="notification-dispatcher")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+        task, self._task = self._task, None
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await self.schedule_legacy()
+                await self.requeue_stale()
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("Notification dispatch tick failed")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # backlog: keep draining without sleeping
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def schedule_legacy(self) -> None:
+        """Make rows from before ``next_run_at`` existed due at their ``created_at``.
+
+        Filling the column keeps the claim a range scan on the index instead of
+        an ``OR next_run_at IS NULL``; once backfilled this is an empty lookup.
+        """
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Notification)
+                .where(Notification.status == "scheduled", Notification.next_run_at.is_(None))
+                .values(next_run_at=Notification.created_at)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def requeue_stale(self) -> None:
+        """Return rows left in ``sending`` by a crashed worker to the queue."""
+        cutoff = utcnow() - timedelta(seconds=self.stale_seconds)
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Notification)
+                .where(Notification.status == "sending", Notification.updated_at < cutoff)
+                .values(status="scheduled")
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def run_once(self) -> int:
+        """Claim and deliver one batch of due notifications; returns the batch size."""
+        now = utcnow()
+        async with AsyncSessionLocal() as session:
+            due = (
+                select(Notification.id)
+                .where(Notification.status == "scheduled", Notification.next_run_at <= now)
+                .order_by(Notification.next_run_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = list(await session.scalars(
+                update(Notification)
+                .where(Notification.id.in_(due), Notification.status == "scheduled")
+                .values(status="sending", attempts=Notification.attempts + 1)
+                .returning(Notification)
+                .execution_options(synchronize_session=False)
+            ))
+            await session.commit()
+            if not claimed:
+                return 0
+            self.ticks += 1
+
+            by_channel: dict[str, list[Notification]] = defaultdict(list)
+            for notification in claimed:
+                by_channel[notification.delivery_channel].append(notification)
+            errors: dict[int, Exception] = {}
+            for name, batch in by_channel.items():
+                channel = channels.get(name)
+                if channel is None:
+                    errors.update({n.id: PermanentDeliveryError(f"Unknown channel {name!r}") for n in batch})
+                    continue
+                try:
+                    errors.update(await channel.send(batch))
+                except Exception as exc:
+                    logger.exception("Channel %s failed a batch of %d", name, len(batch))
+                    errors.update({n.id: exc for n in batch})
+
+            sent_ids = [n.id for n in claimed if n.id not in errors]
+            outcomes: list[dict[str, Any]] = []
+            retry_at = now + timedelta(seconds=self.retry_seconds)
+            for notification in claimed:
+                exc = errors.get(notification.id)
+                if exc is None:
+                    continue
+                permanent = isinstance(exc, PermanentDeliveryError)
+                retry = not permanent and notification.attempts < self.max_attempts
+                outcomes.append({
+                    "id": notification.id,
+                    "status": "scheduled" if retry else "failed",
+                    "next_run_at": retry_at if retry else notification.next_run_at,
+                    "last_error": f"{type(exc).__name__}: {exc}"[:1000],
+                })
+            if sent_ids:
+                await session.execute(
+                    update(Notification)
+                    .where(Notification.id.in_(sent_ids))
+                    .values(status="sent", sent_at=now, last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+            if outcomes:
+                # ORM bulk UPDATE by primary key: one executemany.
+                await session.execute(update(Notification), outcomes)
+            await session.commit()
+
+        self.sent += len(sent_ids)
+        self.retried += sum(1 for o in outcomes if o["status"] == "scheduled")
+        self.failed += sum(1 for o in outcomes if o["status"] == "failed")
+        statuses = {o["id"]: o["status"] for o in outcomes}
+        for notification in claimed:
+            hub.publish(user_channel(notification.user_id), "notification.status", {
+                "id": notification.id, "status": statuses.get(notification.id, "sent"),
+            })
+        return len(claimed)
+
+    def stats(self) -> dict[str, int]:
+        return {"sent": self.sent, "failed": self.failed, "retried": self.retried, "ticks": self.ticks}
+
+
+dispatcher = NotificationDispatcher(
+    settings.NOTIFY_BATCH_SIZE,
+    settings.NOTIFY_POLL_SECONDS,
+    settings.NOTIFY_MAX_ATTEMPTS,
+    settings.NOTIFY_RETRY_SECONDS,
+    settings.NOTIFY_STALE_SECONDS,
+)
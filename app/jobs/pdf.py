@@ -0,0 +1,82 @@
+"""Minimal streaming PDF writer for text reports (no third-party dependency).
+
+Pages are written to the file object as soon as they are laid out; only the
+object byte offsets are kept in memory for the cross-reference table.
+"""
+
+from typing import BinaryIO, Iterable
+
+PAGE_WIDTH = 595  # A4 in points
+PAGE_HEIGHT = 842
+MARGIN = 50
+LEADING = 14
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+
+def _escape(text: str) -> bytes:
+    text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return text.encode("latin-1", errors="replace")
+
+
+class _Writer:
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        self.offset = 0
+        self.offsets: dict[int, int] = {}
+
+    def raw(self, data: bytes) -> None:
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def obj(self, number: int, body: bytes) -> None:
+        self.offsets[number] = self.offset
+        self.raw(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+
+def write_text_pdf(fp: BinaryIO, title: str, lines: Iterable[str]) -> int:
+    """Write ``title`` and ``lines`` as a paginated PDF; returns pages written."""
+    out = _Writer(fp)
+    out.raw(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    # 1 = catalog, 2 = page tree, 3 = font; pages start at 4 (content, page).
+    out.obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    next_number = 4
+    page_numbers: list[int] = []
+
+    def flush(page_lines: list[bytes], first: bool) -> None:
+        nonlocal next_number
+        content = [b"BT", b"/F1 16 Tf" if first else b"/F1 10 Tf", b"%d TL" % LEADING,
+                   b"%d %d Td" % (MARGIN, PAGE_HEIGHT - MARGIN)]
+        for idx, line in enumerate(page_lines):
+            if first and idx == 1:
+                content.append(b"/F1 10 Tf")
+            content.append(b"(" + line + b") Tj T*")
+        content.append(b"ET")
+        stream = b"\n".join(content)
+        content_number, page_number = next_number, next_number + 1
+        next_number += 2
+        out.obj(content_number, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        out.obj(
+            page_number,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] " % (PAGE_WIDTH, PAGE_HEIGHT)
+            + b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_number,
+        )
+        page_numbers.append(page_number)
+
+    page: list[bytes] = [_escape(title), b""]
+    for line in lines:
+        if len(page) >= LINES_PER_PAGE:
+            flush(page, first=not page_numbers)
+            page = []
+        page.append(_escape(line))
+    flush(page, first=not page_numbers)
+
+    kids = b" ".join(b"%d 0 R" % n for n in page_numbers)
+    out.obj(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_numbers))
+    out.obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    xref_offset = out.offset
+    total = next_number
+    out.raw(b"xref\n0 %d\n0000000000 65535 f \n" % total)
+    for number in range(1, total):
+        out.raw(b"%010d 00000 n \n" % out.offsets[number])
+    out.raw(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (total, xref_offset))
+    return len(page_numbers)
@@ -0,0 +1,249 @@
+"""DB-backed report rendering queue.
+
+``generate_report`` inserts a ``Report`` row with status ``queued`` and wakes
+the workers. Each worker task claims one queued row with a compare-and-set
+UPDATE (safe across workers and processes), loads the project's latest
+``Calculation`` and its ``Visualization`` rows, renders the PDF on a thread
+straight to disk and records ``done``. Failures go back to ``queued`` until
+``REPORT_MAX_ATTEMPTS`` is reached, then end as ``failed``. A row left in
+``rendering`` longer than ``REPORT_STALE_SECONDS`` (its worker died) is
+claimed again while it has attempts left and failed once it has none.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import func, or_, select, update
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.events import hub, project_channel
+from app.history import hydrate, latest
+from app.jobs.pdf import write_text_pdf
+from app.models import Calculation, Project, Report, Visualization
+
+logger = logging.getLogger(__name__)
+
+
+class JobStats:
+    def __init__(self):
+        self.done = 0
+        self.failed = 0
+        self.retried = 0
+        self.duration_seconds_total = 0.0
+        self.duration_seconds_max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.duration_seconds_total += seconds
+        self.duration_seconds_max = max(self.duration_seconds_max, seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        finished = self.done + self.failed
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "retried": self.retried,
+            "duration_seconds_total": round(self.duration_seconds_total, 6),
+            "duration_seconds_max": round(self.duration_seconds_max, 6),
+            "duration_seconds_avg": round(self.duration_seconds_total / finished, 6) if finished else 0.0,
+        }
+
+
+def publish_status(report: Report) -> None:
+    hub.publish(project_channel(report.project_id), "report.status", {
+        "id": report.id, "project_id": report.project_id, "status": report.status,
+    })
+
+
+def report_lines(project: Project, calc: Calculation | None, visualizations: list[Visualization]) -> list[str]:
+    lines = [f"Project #{project.id}  Currency: {project.currency}  Status: {project.status}", ""]
+    if calc is None:
+        lines.append("No calculation has been run for this project yet.")
+    else:
+        results = calc.results_json or {}
+        lines.append(f"Calculation v{calc.version}")
+        for key in ("dc_kw", "kwh_per_kwdc", "est_annual_kwh"):
+            if key in results:
+                lines.append(f"  {key}: {results[key]}")
+        monthly = results.get("monthly_kwh") or []
+        if monthly:
+            lines += ["", "Monthly production (kWh)"]
+            lines += [f"  {month:>2}: {value}" for month, value in enumerate(monthly, start=1)]
+        for note in results.get("notes") or []:
+            lines.append(f"  * {note}")
+    if visualizations:
+        lines += ["", "Visualizations"]
+        for viz in visualizations:
+            keys = ", ".join(sorted((viz.config_json or {}).keys()))
+            lines.append(f"  {viz.chart_type}: {keys}")
+    return lines
+
+
+def _render_to_disk(path: Path, title: str, lines: list[str]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A temp file per attempt: a render abandoned on timeout may still be
+    # writing while the retry runs, and each must only ever publish a whole file.
+    fd, partial = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}-", suffix=".pdf.part")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            write_text_pdf(fp, title, lines)
+        os.replace(partial, path)
+    except BaseException:
+        Path(partial).unlink(missing_ok=True)
+        raise
+
+
+class ReportQueue:
+    def __init__(
+        self,
+        workers: int,
+        max_attempts: int,
+        timeout: float,
+        poll_seconds: float,
+        stale_seconds: float,
+        output_dir: str,
+    ):
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.timeout = timeout
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.output_dir = Path(output_dir)
+        self.stats = JobStats()
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"report-worker-{idx}") for idx in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """Let in-flight renders finish, then stop the workers."""
+        self._stopping = True
+        self._wake.set()
+        tasks, self._tasks = self._tasks, []
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                report_id = await self._claim()
+            except Exception:
+                logger.exception("Report queue claim failed")
+                report_id = None
+            if report_id is not None:
+                await self._process(report_id)
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> int | None:
+        stale_before = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=self.stale_seconds)
+        stale = (Report.status == "rendering") & (Report.started_at < stale_before)
+        claimable = or_(Report.status == "queued", stale & (Report.attempts < self.max_attempts))
+        async with AsyncSessionLocal() as session:
+            # Reports that keep taking their worker down are not retried forever.
+            abandoned = list(await session.scalars(
+                update(Report)
+                .where(stale, Report.attempts >= self.max_attempts)
+                .values(
+                    status="failed", finished_at=func.now(),
+                    error=f"Rendering did not finish after {self.max_attempts} attempts",
+                )
+                .returning(Report)
+                .execution_options(synchronize_session=False)
+            ))
+            await session.commit()
+            for report in abandoned:
+                self.stats.failed += 1
+                publish_status(report)
+            while True:
+                candidate = (await session.execute(
+                    select(Report.id, Report.status).where(claimable).order_by(Report.id).limit(1)
+                )).first()
+                if candidate is None:
+                    return None
+                report_id, seen_status = candidate
+                # Compare-and-set: only one worker wins a given row.
+                res = await session.execute(
+                    update(Report)
+                    .where(Report.id == report_id, Report.status == seen_status)
+                    .values(status="rendering", attempts=Report.attempts + 1, started_at=func.now(), error=None)
+                )
+                await session.commit()
+                if res.rowcount == 1:
+                    return report_id
+
+    async def _process(self, report_id: int) -> None:
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            report = await session.get(Report, report_id)
+            if report is None:
+                return
+            publish_status(report)
+            try:
+                project = await session.get(Project, report.project_id)
+                calc = (await session.execute(latest(Calculation, report.project_id))).scalars().first()
+                await hydrate(session, Calculation, [calc])
+                visualizations = (await session.execute(
+                    select(Visualization)
+                    .where(Visualization.project_id == report.project_id)
+                    .order_by(Visualization.created_at, Visualization.id)
+                )).scalars().all()
+                path = self.output_dir / f"project-{report.project_id}" / f"report-{report.id}.pdf"
+                lines = report_lines(project, calc, list(visualizations))
+                await asyncio.wait_for(
+                    asyncio.to_thread(_render_to_disk, path, project.name, lines), self.timeout
+                )
+            except Exception as exc:
+                logger.exception("Rendering report %s failed", report_id)
+                retry = report.attempts < self.max_attempts
+                report.status = "queued" if retry else "failed"
+                report.error = f"{type(exc).__name__}: {exc}"[:1000]
+                if retry:
+                    self.stats.retried += 1
+                else:
+                    self.stats.failed += 1
+                    report.finished_at = func.now()
+                    self.stats.record(time.perf_counter() - started)
+                await session.commit()
+                publish_status(report)
+                return
+            report.status = "done"
+            report.file_path = str(path)
+            report.finished_at = func.now()
+            await session.commit()
+            publish_status(report)
+        self.stats.done += 1
+        self.stats.record(time.perf_counter() - started)
+
+
+report_queue = ReportQueue(
+    settings.REPORT_WORKERS,
+    settings.REPORT_MAX_ATTEMPTS,
+    settings.REPORT_TIMEOUT_SECONDS,
+    settings.REPORT_POLL_SECONDS,
+    settings.REPORT_STALE_SECONDS,
+    settings.REPORTS_DIR,
+)
@@ -0,0 +1,236 @@
+"""Background consumer for recorded Stripe webhook events.
+
+``stripe_webhook`` only verifies the signature and inserts the event into
+``stripe_events`` with insert-or-ignore on the event id, so Stripe retries
+and duplicate deliveries cost one no-op insert. This consumer claims pending
+events in batches and applies each batch in one transaction: one query for
+the referenced payments, one for the users named in metadata, one bulk
+activation. If a batch fails, its events are re-applied one at a time, so a
+single bad event cannot hold back the others.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.deps import invalidate_user
+from app.models import Payment, StripeEvent, User
+
+logger = logging.getLogger(__name__)
+
+CHECKOUT_COMPLETED = "checkout.session.completed"
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def apply_events(session: AsyncSession, events: list[StripeEvent]) -> set[int]:
+    """Apply checkout completions to payments and users; returns activated user ids.
+
+    Does not commit. Other event types are recorded and otherwise ignored.
+    """
+    completed: list[dict[str, Any]] = [
+        (event.payload_json.get("data") or {}).get("object") or {}
+        for event in events
+        if event.type == CHECKOUT_COMPLETED
+    ]
+    completed = [obj for obj in completed if obj.get("id")]
+    if not completed:
+        return set()
+
+    session_ids = {obj["id"] for obj in completed}
+    payments = {
+        payment.external_id: payment
+        for payment in (await session.scalars(
+            select(Payment).where(Payment.external_id.in_(session_ids))
+        ))
+    }
+    metadata_user_ids = {
+        int(user_id)
+        for obj in completed
+        if obj["id"] not in payments and (user_id := (obj.get("metadata") or {}).get("user_id")) is not None
+    }
+    known_users = set()
+    if metadata_user_ids:
+        known_users = set(await session.scalars(select(User.id).where(User.id.in_(metadata_user_ids))))
+
+    to_activate: set[int] = set()
+    for obj in completed:
+        metadata = obj.get("metadata") or {}
+        payment = payments.get(obj["id"])
+        if payment is None:
+            user_id = metadata.get("user_id")
+            if user_id is None or int(user_id) not in known_users:
+                continue
+            payment = Payment(
+                user_id=int(user_id),
+                provider="stripe",
+                status="paid",
+                external_id=obj["id"],
+                metadata_json=metadata,
+            )
+            session.add(payment)
+            payments[obj["id"]] = payment
+        else:
+            payment.status = "paid"
+            if payment.metadata_json is None:
+                payment.metadata_json = metadata
+        to_activate.add(payment.user_id)
+
+    if not to_activate:
+        return set()
+    activated = await session.scalars(
+        update(User)
+        .where(User.id.in_(to_activate), User.is_active.is_(False))
+        .values(is_active=True)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+    return set(activated)
+
+
+class StripeEventConsumer:
+    def __init__(self, batch_size: int, poll_seconds: float, max_attempts: int, stale_seconds: float):
+        self.batch_size = max(1, batch_size)
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.stale_seconds = stale_seconds
+        self.received = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="stripe-event-consumer")
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+        task, self._task = self._task, None
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await self.requeue_stale()
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("Stripe event batch failed")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def requeue_stale(self) -> None:
+        cutoff = utcnow() - timedelta(seconds=self.stale_seconds)
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(StripeEvent)
+                .where(StripeEvent.status == "processing", StripeEvent.updated_at < cutoff)
+                .values(status="pending")
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def run_once(self) -> int:
+        """Claim and apply one batch of pending events; returns the batch size."""
+        async with AsyncSessionLocal() as session:
+            pending = (
+                select(StripeEvent.id)
+                .where(StripeEvent.status == "pending")
+                .order_by(StripeEvent.received_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = list(await session.scalars(
+                update(StripeEvent)
+                .where(StripeEvent.id.in_(pending), StripeEvent.status == "pending")
+                .values(status="processing", attempts=StripeEvent.attempts + 1)
+                .returning(StripeEvent)
+                .execution_options(synchronize_session=False)
+            ))
+            await session.commit()
+        if not claimed:
+            return 0
+        self.batches += 1
+        if not await self._apply(claimed):
+            for event in claimed:
+                await self._apply([event])
+        return len(claimed)
+
+    async def _apply(self, events: list[StripeEvent]) -> bool:
+        ids = [event.id for event in events]
+        async with AsyncSessionLocal() as session:
+            try:
+                activated = await apply_events(session, events)
+                await session.execute(
+                    update(StripeEvent)
+                    .where(StripeEvent.id.in_(ids))
+                    .values(status="processed", processed_at=utcnow(), last_error=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+            except Exception as exc:
+                await session.rollback()
+                if len(events) > 1:
+                    logger.warning("Stripe batch of %d failed, applying one by one", len(events))
+                    return False
+                logger.exception("Stripe event %s failed", ids[0])
+                retry = events[0].attempts < self.max_attempts
+                await session.execute(
+                    update(StripeEvent)
+                    .where(StripeEvent.id == ids[0])
+                    .values(status="pending" if retry else "failed", last_error=f"{type(exc).__name__}: {exc}"[:1000])
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                if not retry:
+                    self.failed += 1
+                return False
+        # Core UPDATE bypasses the ORM listeners in app.deps; evict explicitly.
+        for user_id in activated:
+            invalidate_user(user_id)
+        self.processed += len(events)
+        return True
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+stripe_consumer = StripeEventConsumer(
+    settings.STRIPE_EVENTS_BATCH_SIZE,
+    settings.STRIPE_EVENTS_POLL_SECONDS,
+    settings.STRIPE_EVENTS_MAX_ATTEMPTS,
+    settings.STRIPE_EVENTS_STALE_SECONDS,
+)
@@ -1,7 +1,17 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.config import settings
 from app.db import init_db
+from app.instrumentation import MetricsMiddleware
+from app.responses import json_response_class
+from app.executors import ExecutorBusy, ExecutorTimeout, calc_executor
+from app.passwords import hash_executor
+from app.jobs.reports import report_queue
+from app.jobs.notifications import dispatcher
+from app.jobs.stripe_events import stripe_consumer
 from app.auth import router as auth_router
 from app.routers.projects import router as projects_router
 from app.routers.calcs import router as calcs_router
@@ -10,8 +20,32 @@ from app.routers.reports import router as reports_router
 from app.routers.payments import router as payments_router
 from app.routers.users import router as users_router
 from app.routers.notifications import router as notifications_router
+from app.routers.metrics import router as metrics_router
+from app.routers.events import router as events_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    calc_executor.start()
+    hash_executor.start()
+    report_queue.start()
+    dispatcher.start()
+    stripe_consumer.start()
+    try:
+        yield
+    finally:
+        await stripe_consumer.stop()
+        await dispatcher.stop()
+        await report_queue.stop()
+        await hash_executor.shutdown()
+        await calc_executor.shutdown()
 
-app = FastAPI(title="Solar Sizing API", version="0.1.0")
+app = FastAPI(
+    title="Solar Sizing API",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=json_response_class(),
+)
 
 # CORS
 explicit = [o.strip() for o in settings.ALLOWED_ORIGINS.split(",") if o.strip()]
@@ -23,11 +57,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Content-Disposition", "ETag", "Server-Timing", "X-Next-Cursor", "X-Series-Dtype", "X-Series-Byte-Order", "X-Series-Shape"],
 )
+# Added last so it wraps CORS and times the whole request.
+app.add_middleware(MetricsMiddleware)
 
-@app.on_event("startup")
-async def on_startup():
-    await init_db()
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request: Request, exc: ExecutorBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(ExecutorTimeout)
+async def executor_timeout_handler(request: Request, exc: ExecutorTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
 
 @app.get("/health")
 async def health():
@@ -38,6 +79,8 @@ app.include_router(projects_router, prefix="/projects", tags=["projects"])
 app.include_router(calcs_router, prefix="/projects", tags=["calculations"])
 app.include_router(visualizations_router, prefix="/projects", tags=["visualizations"])
 app.include_router(reports_router, prefix="/projects", tags=["reports"])
+app.include_router(events_router, prefix="/projects", tags=["events"])
 app.include_router(payments_router, prefix="/payments", tags=["payments"])
 app.include_router(users_router, prefix="/users/me", tags=["users"])
 app.include_router(notifications_router, prefix="/notifications", tags=["notifications"])
+app.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
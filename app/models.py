@@ -1,7 +1,14 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, ForeignKey, DateTime, JSON, Boolean, func
+from sqlalchemy import String, Integer, ForeignKey, DateTime, JSON, Boolean, Index, LargeBinary, UniqueConstraint, func, literal_column
 from app.db import Base
 
+
+def _row_version():
+    # Bumped by every UPDATE, ORM or Core, so list ETags change even when
+    # updated_at (whole seconds on SQLite) does not.
+    return mapped_column(Integer, default=1, server_default="1", onupdate=literal_column("row_version + 1"))
+
+
 class Org(Base):
     __tablename__ = "orgs"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -22,30 +29,44 @@ class User(Base):
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (Index("ix_projects_owner_created", "owner_id", "created_at", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     org_id: Mapped[int | None] = mapped_column(ForeignKey("orgs.id"), nullable=True, index=True)
-    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     name: Mapped[str] = mapped_column(String(200))
     site_location_json: Mapped[dict | None] = mapped_column(JSON, default=None)
     currency: Mapped[str] = mapped_column(String(10), default="USD")
     status: Mapped[str] = mapped_column(String(50), default="draft")
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
     updated_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    row_version: Mapped[int] = _row_version()
 
 class ProjectInputs(Base):
     __tablename__ = "project_inputs"
+    # Also serves "latest version" lookups via a backward index scan.
+    __table_args__ = (UniqueConstraint("project_id", "version", name="uq_project_inputs_project_version"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"))
     version: Mapped[int] = mapped_column(Integer, default=1)
-    payload_json: Mapped[dict] = mapped_column(JSON)
+    # NULL on delta rows; see app/history.py.
+    payload_json: Mapped[dict | None] = mapped_column(JSON(none_as_null=True), nullable=True)
+    delta_json: Mapped[list | None] = mapped_column(JSON(none_as_null=True), nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
 class Calculation(Base):
     __tablename__ = "calculations"
+    __table_args__ = (UniqueConstraint("project_id", "version", name="uq_calculations_project_version"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"))
     version: Mapped[int] = mapped_column(Integer, default=1)
-    results_json: Mapped[dict] = mapped_column(JSON)
+    results_json: Mapped[dict | None] = mapped_column(JSON(none_as_null=True), nullable=True)
+    delta_json: Mapped[list | None] = mapped_column(JSON(none_as_null=True), nullable=True)
+    # 8760 little-endian float32 values, see app/calcs/series.py.
+    hourly_series: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True, deferred=True)
+    series_encoding: Mapped[str | None] = mapped_column(String(16), nullable=True)
+    inputs_hash: Mapped[str | None] = mapped_column(String(64), index=True, nullable=True)
+    # ProjectInputs.version the results were computed from; NULL on older rows.
+    inputs_version: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
 
@@ -72,10 +93,27 @@ class Payment(Base):
     )
 
 
+class StripeEvent(Base):
+    """Webhook deliveries keyed by Stripe event id; a retried delivery is ignored."""
+    __tablename__ = "stripe_events"
+    __table_args__ = (Index("ix_stripe_events_status_received", "status", "received_at"),)
+    id: Mapped[str] = mapped_column(String(255), primary_key=True)
+    type: Mapped[str] = mapped_column(String(100))
+    payload_json: Mapped[dict] = mapped_column(JSON)
+    # pending -> processing -> processed | failed (transient failures go back to pending)
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+    received_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    processed_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class Visualization(Base):
     __tablename__ = "visualizations"
+    __table_args__ = (Index("ix_visualizations_project_created", "project_id", "created_at", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"))
     chart_type: Mapped[str] = mapped_column(String(50))
     config_json: Mapped[dict] = mapped_column(JSON)
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
@@ -83,18 +121,31 @@ class Visualization(Base):
 
 class Report(Base):
     __tablename__ = "reports"
+    __table_args__ = (
+        Index("ix_reports_project_created", "project_id", "created_at", "id"),
+        Index("ix_reports_status_id", "status", "id"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"), index=True)
+    project_id: Mapped[int] = mapped_column(ForeignKey("projects.id"))
     format: Mapped[str] = mapped_column(String(20))
     deliver_to_json: Mapped[dict] = mapped_column(JSON)
-    status: Mapped[str] = mapped_column(String(20), default="prepared")
+    # queued -> rendering -> done | failed (failed attempts go back to queued)
+    status: Mapped[str] = mapped_column(String(20), default="queued")
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    file_path: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    error: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+    started_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    row_version: Mapped[int] = _row_version()
 
 
 class SocialLink(Base):
     __tablename__ = "social_links"
+    __table_args__ = (Index("ix_social_links_user_created", "user_id", "created_at", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     platform: Mapped[str] = mapped_column(String(50))
     handle: Mapped[str] = mapped_column(String(200))
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
@@ -102,20 +153,33 @@ class SocialLink(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_created", "user_id", "created_at", "id"),
+        # The dispatcher only ever range-scans due rows of one status.
+        Index("ix_notifications_status_next_run", "status", "next_run_at"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     title: Mapped[str] = mapped_column(String(200))
     message: Mapped[str] = mapped_column(String(1000))
     delivery_channel: Mapped[str] = mapped_column(String(50), default="push")
+    # scheduled -> sending -> sent | failed (transient failures go back to scheduled)
     status: Mapped[str] = mapped_column(String(20), default="scheduled")
     schedule_json: Mapped[dict | None] = mapped_column(JSON, default=None)
+    next_run_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(String(1000), nullable=True)
+    sent_at: Mapped[DateTime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    row_version: Mapped[int] = _row_version()
 
 
 class Dashboard(Base):
     __tablename__ = "dashboards"
+    __table_args__ = (Index("ix_dashboards_user_created", "user_id", "created_at", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     name: Mapped[str] = mapped_column(String(200))
     preference: Mapped[str] = mapped_column(String(100))
     layout_json: Mapped[dict] = mapped_column(JSON)
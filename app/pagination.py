@@ -0,0 +1,165 @@
+"""Keyset pagination and field projection for list endpoints.
+
+Lists are ordered newest first on ``(created_at, id)``. Each page returns at
+most ``limit`` rows; when more exist, the ``X-Next-Cursor`` response header
+carries an opaque cursor for the next page. ``fields=a,b`` selects only those
+columns, so large JSON columns are never loaded when the client skips them.
+
+Every page carries a weak ``ETag`` built from one aggregate over the whole
+filtered collection (row count, highest id, newest ``created_at`` and
+``updated_at``, and the sum of ``row_version`` on models that have one), the
+caller's scope (the user) and the page parameters. A matching
+``If-None-Match`` returns 304 before any row is loaded or serialized.
+``row_version`` goes up on every UPDATE, so edits within the same second
+(SQLite stores timestamps to the second) still change the tag.
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, Query, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import Select, String, and_, desc, func, literal, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.responses import dump_list, dump_projection
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class PageParams:
+    def __init__(
+        self,
+        request: Request,
+        cursor: str | None = Query(default=None, description="Opaque cursor from X-Next-Cursor"),
+        limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        fields: str | None = Query(default=None, description="Comma-separated fields to return"),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.fields = fields
+        self.if_none_match = request.headers.get("if-none-match")
+
+    def selected_fields(self, schema: type[BaseModel]) -> list[str] | None:
+        if not self.fields:
+            return None
+        names = list(dict.fromkeys(f.strip() for f in self.fields.split(",") if f.strip()))
+        unknown = [name for name in names if name not in schema.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return names or None
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _timestamp_param(session: AsyncSession, value: datetime):
+    if session.bind.dialect.name == "sqlite":
+        # SQLite stores CURRENT_TIMESTAMP as text without microseconds while
+        # SQLAlchemy binds datetimes with them; compare in the stored format.
+        text = value.strftime("%Y-%m-%d %H:%M:%S")
+        if value.microsecond:
+            text += f".{value.microsecond:06d}"
+        return literal(text, String)
+    return value
+
+
+async def collection_etag(session: AsyncSession, stmt: Select, model, page: PageParams, scope) -> str:
+    aggregates = [func.count(), func.max(model.id), func.max(model.created_at)]
+    if hasattr(model, "updated_at"):
+        aggregates.append(func.max(model.updated_at))
+    if hasattr(model, "row_version"):
+        aggregates.append(func.sum(model.row_version))
+    state = (await session.execute(
+        stmt.with_only_columns(*aggregates, maintain_column_froms=True).order_by(None)
+    )).one()
+    raw = json.dumps(
+        [model.__tablename__, scope, page.cursor, page.limit, page.fields, *(str(v) for v in state)]
+    )
+    return f'W/"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+async def paginate(
+    session: AsyncSession,
+    stmt: Select,
+    model,
+    schema: type[BaseModel],
+    page: PageParams,
+    response: Response,
+    scope=None,
+):
+    """Run ``stmt`` (a ``select(model)`` with filters) as one keyset page.
+
+    ``scope`` identifies whose view this is (the user id) and goes into the ETag.
+    """
+    fields = page.selected_fields(schema)
+    etag = await collection_etag(session, stmt, model, page, scope)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(page.if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+    if page.cursor:
+        created_at, row_id = decode_cursor(page.cursor)
+        ts = _timestamp_param(session, created_at)
+        stmt = stmt.where(
+            or_(model.created_at < ts, and_(model.created_at == ts, model.id < row_id))
+        )
+    stmt = stmt.order_by(desc(model.created_at), desc(model.id)).limit(page.limit + 1)
+
+    if fields:
+        keys = list(dict.fromkeys(["id", "created_at", *fields]))
+        stmt = stmt.with_only_columns(*(getattr(model, key) for key in keys))
+        rows = (await session.execute(stmt)).mappings().all()
+    else:
+        rows = (await session.execute(stmt)).scalars().all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        if fields:
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        else:
+            next_cursor = encode_cursor(last.created_at, last.id)
+
+    if fields:
+        projected = Response(
+            content=dump_projection(schema, fields, rows), media_type="application/json", headers=cache_headers
+        )
+        if next_cursor:
+            projected.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return projected
+    if settings.FAST_JSON:
+        # Serialize here in one pass; FastAPI passes a returned Response through.
+        fast = Response(content=dump_list(schema, rows), media_type="application/json", headers=cache_headers)
+        if next_cursor:
+            fast.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return fast
+    response.headers.update(cache_headers)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return rows
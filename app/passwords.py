@@ -0,0 +1,43 @@
+"""Argon2 hashing on a dedicated, size-limited thread pool.
+
+Argon2 is deliberately CPU- and memory-hard, so hashing on the event loop
+stalls every other request on the worker. argon2-cffi releases the GIL while
+hashing, which lets a small thread pool run hashes in parallel. When the pool
+and its queue are full, callers get ``ExecutorBusy`` (503) instead of piling up.
+"""
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+
+from app.config import settings
+from app.executors import BoundedExecutor
+
+ph = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM,
+)
+
+hash_executor = BoundedExecutor(
+    "password-hash",
+    "thread",
+    settings.PASSWORD_HASH_WORKERS,
+    settings.PASSWORD_HASH_MAX_QUEUE,
+    settings.PASSWORD_HASH_TIMEOUT_SECONDS,
+)
+
+
+async def hash_password(password: str) -> str:
+    return await hash_executor.run(ph.hash, password)
+
+
+async def verify_password(password_hash: str, password: str) -> bool:
+    try:
+        return await hash_executor.run(ph.verify, password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True when the stored hash was made with different Argon2 parameters."""
+    return ph.check_needs_rehash(password_hash)
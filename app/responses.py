@@ -0,0 +1,74 @@
+"""Fast JSON serialization, enabled with ``FAST_JSON=true``.
+
+``FastJSONResponse`` renders with orjson instead of ``json.dumps`` and is
+installed as the app's default response class. List endpoints go further:
+``paginate`` validates rows with a cached ``TypeAdapter(list[Schema])`` and
+writes the JSON bytes straight from pydantic-core (``dump_json``), skipping
+FastAPI's dump-to-dicts-then-encode round trip. ``fields=`` projections are
+dumped the same way through a partial model holding only the selected
+fields, so datetimes and other non-JSON types serialize whether or not
+``FAST_JSON`` is on. Without orjson installed the response class falls back
+to the standard encoder.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter, create_model
+
+from app.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def _orjson_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+
+
+def json_response_class() -> type[JSONResponse]:
+    return FastJSONResponse if settings.FAST_JSON else JSONResponse
+
+
+@lru_cache(maxsize=None)
+def list_adapter(schema: type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(list[schema])
+
+
+def dump_list(schema: type[BaseModel], rows: list) -> bytes:
+    """Validate ORM rows (or mappings) against ``schema`` and return JSON bytes."""
+    adapter = list_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+
+@lru_cache(maxsize=256)
+def projection_adapter(schema: type[BaseModel], fields: tuple[str, ...]) -> TypeAdapter:
+    partial = create_model(
+        f"{schema.__name__}Fields",
+        **{name: (schema.model_fields[name].annotation, schema.model_fields[name]) for name in fields},
+    )
+    return TypeAdapter(list[partial])
+
+
+def dump_projection(schema: type[BaseModel], fields: list[str], rows: list) -> bytes:
+    """Like ``dump_list`` for rows holding only ``fields`` of ``schema``."""
+    adapter = projection_adapter(schema, tuple(fields))
+    return adapter.dump_json(adapter.validate_python([{key: row[key] for key in fields} for row in rows]))
@@ -1,31 +1,248 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from app.db import get_session
+from sqlalchemy import select, func, and_
+from sqlalchemy.orm import aliased, undefer
+from app.db import AsyncSessionLocal, get_session
 from app.models import Project, ProjectInputs, Calculation, User
-from app.schemas import CalcResultOut
+from app.schemas import MAX_BATCH_PROJECTS, CalcResultOut, BatchCalcIn, BatchCalcOut, BatchCalcError, OptimizeIn, OptimizeOut
 from app.deps import active_user_required
-from app.calcs import solar
+from app.calcs import solar, memo, optimize, series
+from app.config import settings
+from app.executors import ExecutorBusy, ExecutorTimeout, calc_executor
+from app import history
+from app.events import hub, project_channel
 
 router = APIRouter()
 
+
+async def _resolve_results(
+    session: AsyncSession, pending: dict[str, dict]
+) -> tuple[dict[str, tuple[dict, bool]], dict[str, str]]:
+    """Map input hashes to (results, cache_hit), running the engine only for unseen inputs.
+
+    Inputs the engine rejects come back in the second mapping, hash -> error,
+    so one bad project never sinks the rest of a batch.
+    """
+    resolved: dict[str, tuple[dict, bool]] = {}
+    failed: dict[str, str] = {}
+    for key in pending:
+        cached = memo.result_cache.get(key)
+        if cached is not None:
+            resolved[key] = (cached, True)
+    unknown = [key for key in pending if key not in resolved]
+    if unknown:
+        first_ids = (
+            select(func.min(Calculation.id))
+            .where(Calculation.inputs_hash.in_(unknown))
+            .group_by(Calculation.inputs_hash)
+        )
+        stored = (await session.scalars(
+            select(Calculation).options(undefer(Calculation.hourly_series)).where(Calculation.id.in_(first_ids))
+        )).all()
+        for calc in await history.hydrate(session, Calculation, stored):
+            results = series.join(calc)
+            memo.result_cache.put(calc.inputs_hash, results)
+            resolved[calc.inputs_hash] = (results, True)
+    to_compute = [key for key in unknown if key not in resolved]
+    if to_compute:
+        # Spread the batch over the pool: one job per worker, never one per project.
+        step = -(-len(to_compute) // calc_executor.max_workers)
+        chunks = [to_compute[i:i + step] for i in range(0, len(to_compute), step)]
+        outputs = await asyncio.gather(*(
+            calc_executor.run(solar.calculate_many, [pending[key] for key in chunk])
+            for chunk in chunks
+        ), return_exceptions=True)
+        for chunk, chunk_results in zip(chunks, outputs):
+            if isinstance(chunk_results, (ExecutorBusy, ExecutorTimeout)) or not isinstance(chunk_results, (list, Exception)):
+                raise chunk_results
+            if isinstance(chunk_results, Exception):
+                # Some input in the chunk is bad: redo the chunk one project at a time.
+                retried = await calc_executor.run(solar.calculate_each, [pending[key] for key in chunk])
+                for key, (results, error) in zip(chunk, retried):
+                    if error is not None:
+                        failed[key] = error
+                    else:
+                        memo.result_cache.put(key, results)
+                        resolved[key] = (results, False)
+                continue
+            for key, results in zip(chunk, chunk_results):
+                memo.result_cache.put(key, results)
+                resolved[key] = (results, False)
+    return resolved, failed
+
+
+def _publish_created(calc: Calculation) -> None:
+    hub.publish(project_channel(calc.project_id), "calculation.created", {
+        "id": calc.id, "project_id": calc.project_id, "version": calc.version,
+    })
+
+
+async def calculate_projects(session: AsyncSession, owner_id: int, project_ids: list[int]) -> BatchCalcOut:
+    """Calculate the latest inputs of several owned projects in one pass."""
+    project_ids = list(dict.fromkeys(project_ids))
+    # One set-based read: owned projects, their latest inputs and latest calculation.
+    latest_inputs = history.latest_versions(ProjectInputs, project_ids).subquery()
+    last_calcs = history.latest_versions(Calculation, project_ids).subquery()
+    last_calc = aliased(Calculation)
+    rows = (await session.execute(
+        select(Project.id, ProjectInputs, last_calc)
+        .outerjoin(latest_inputs, latest_inputs.c.project_id == Project.id)
+        .outerjoin(ProjectInputs, and_(
+            ProjectInputs.project_id == latest_inputs.c.project_id,
+            ProjectInputs.version == latest_inputs.c.version,
+        ))
+        .outerjoin(last_calcs, last_calcs.c.project_id == Project.id)
+        .outerjoin(last_calc, and_(
+            last_calc.project_id == last_calcs.c.project_id,
+            last_calc.version == last_calcs.c.version,
+        ))
+        .where(Project.id.in_(project_ids), Project.owner_id == owner_id)
+    )).all()
+    await history.hydrate(session, ProjectInputs, [inputs for _, inputs, _ in rows])
+    found = {project_id: (inputs, calc) for project_id, inputs, calc in rows}
+
+    errors: list[BatchCalcError] = []
+    unchanged: list[CalcResultOut] = []
+    to_run: list[tuple[int, str, int]] = []
+    pending: dict[str, dict] = {}
+    for project_id in project_ids:
+        if project_id not in found:
+            errors.append(BatchCalcError(project_id=project_id, detail="Project not found"))
+            continue
+        inputs, calc = found[project_id]
+        if inputs is None:
+            errors.append(BatchCalcError(project_id=project_id, detail="No inputs found for project"))
+            continue
+        key = memo.inputs_hash(inputs.payload_json)
+        if calc is not None and calc.inputs_hash == key:
+            await history.hydrate(session, Calculation, [calc])
+            unchanged.append(CalcResultOut.model_validate(calc).model_copy(update={"cache_hit": True}))
+            continue
+        pending[key] = inputs.payload_json
+        to_run.append((project_id, key, inputs.version))
+
+    resolved, failed = await _resolve_results(session, pending)
+    for project_id, key, _ in to_run:
+        if key in failed:
+            errors.append(BatchCalcError(project_id=project_id, detail=f"Invalid inputs: {failed[key]}"))
+    to_run = [entry for entry in to_run if entry[1] not in failed]
+    created: list[CalcResultOut] = []
+    if to_run:
+        new_calcs = [
+            {
+                "project_id": project_id, **series.split(resolved[key][0], settings.SERIES_COMPRESSION),
+                "inputs_hash": key, "inputs_version": inputs_version,
+            }
+            for project_id, key, inputs_version in to_run
+        ]
+        inserted = await history.insert_history(session, Calculation, new_calcs)
+        for calc in inserted:
+            _publish_created(calc)
+        created = [
+            CalcResultOut.model_validate(calc).model_copy(update={"cache_hit": resolved[calc.inputs_hash][1]})
+            for calc in inserted
+        ]
+    return BatchCalcOut(results=unchanged + created, errors=errors)
+
+
+async def calculate_in_background(owner_id: int, project_ids: list[int]) -> None:
+    """Queued calculation for freshly created projects, in ``BatchCalcIn``-sized chunks."""
+    async with AsyncSessionLocal() as session:
+        for start in range(0, len(project_ids), MAX_BATCH_PROJECTS):
+            await calculate_projects(session, owner_id, project_ids[start:start + MAX_BATCH_PROJECTS])
+
+
+@router.post("/calculate:batch", response_model=BatchCalcOut)
+async def run_calc_batch(payload: BatchCalcIn, session: AsyncSession = Depends(get_session), user: User = Depends(active_user_required)):
+    return await calculate_projects(session, user.id, payload.project_ids)
+
 @router.post("/{project_id}/calculate", response_model=CalcResultOut)
 async def run_calc(project_id: int, session: AsyncSession = Depends(get_session), user: User = Depends(active_user_required)):
     proj = (await session.execute(select(Project).where(Project.id == project_id))).scalar_one_or_none()
     if not proj or proj.owner_id != user.id:
         raise HTTPException(status_code=404, detail="Project not found")
-    latest_inputs = (await session.execute(
-        select(ProjectInputs).where(ProjectInputs.project_id == project_id).order_by(desc(ProjectInputs.version))
-    )).scalars().first()
+    latest_inputs = (await session.execute(history.latest(ProjectInputs, project_id))).scalars().first()
     if not latest_inputs:
         raise HTTPException(status_code=400, detail="No inputs found for project")
-    # Call your algorithm module
-    results = solar.calculate(latest_inputs.payload_json)
-    # Version = previous calc version + 1
-    last_calc = (await session.execute(select(Calculation).where(Calculation.project_id == project_id).order_by(desc(Calculation.version)))).scalars().first()
-    version = (last_calc.version + 1) if last_calc else 1
-    calc = Calculation(project_id=project_id, version=version, results_json=results)
-    session.add(calc)
-    await session.commit()
-    await session.refresh(calc)
-    return calc
+    await history.hydrate(session, ProjectInputs, [latest_inputs])
+    key = memo.inputs_hash(latest_inputs.payload_json)
+    last_calc = (await session.execute(history.latest(Calculation, project_id))).scalars().first()
+    # Same inputs as the latest calculation: nothing to store.
+    if last_calc and last_calc.inputs_hash == key:
+        await history.hydrate(session, Calculation, [last_calc])
+        return CalcResultOut.model_validate(last_calc).model_copy(update={"cache_hit": True})
+    # Call your algorithm module (skipped when these inputs were already calculated)
+    resolved, failed = await _resolve_results(session, {key: latest_inputs.payload_json})
+    if key in failed:
+        raise HTTPException(status_code=400, detail=f"Invalid inputs: {failed[key]}")
+    results, cache_hit = resolved[key]
+    # Version = previous calc version + 1, allocated by the database
+    (calc,) = await history.insert_history(session, Calculation, [{"project_id": project_id, **series.split(results, settings.SERIES_COMPRESSION), "inputs_hash": key, "inputs_version": latest_inputs.version}])
+    _publish_created(calc)
+    return CalcResultOut.model_validate(calc).model_copy(update={"cache_hit": cache_hit})
+
+
+@router.post("/{project_id}/optimize", response_model=OptimizeOut)
+async def run_optimize(project_id: int, payload: OptimizeIn, session: AsyncSession = Depends(get_session), user: User = Depends(active_user_required)):
+    proj = (await session.execute(select(Project).where(Project.id == project_id))).scalar_one_or_none()
+    if not proj or proj.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Project not found")
+    latest_inputs = (await session.execute(history.latest(ProjectInputs, project_id))).scalars().first()
+    if not latest_inputs:
+        raise HTTPException(status_code=400, detail="No inputs found for project")
+    await history.hydrate(session, ProjectInputs, [latest_inputs])
+    # The whole grid is one executor job; nothing is stored.
+    try:
+        return await calc_executor.run(optimize.optimize, latest_inputs.payload_json, payload.model_dump())
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/{project_id}/calculations/{version}/series")
+async def get_series(
+    project_id: int,
+    version: int,
+    request: Request,
+    format: Literal["binary", "json"] = Query(default="binary"),
+    resolution: Literal["hourly", "daily", "monthly"] = Query(default="hourly"),
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(active_user_required),
+):
+    proj = (await session.execute(select(Project).where(Project.id == project_id))).scalar_one_or_none()
+    if not proj or proj.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Project not found")
+    calc = (await session.execute(
+        select(Calculation)
+        .options(undefer(Calculation.hourly_series))
+        .where(Calculation.project_id == project_id, Calculation.version == version)
+    )).scalar_one_or_none()
+    if not calc:
+        raise HTTPException(status_code=404, detail="Calculation not found")
+    if format == "json" and resolution == "hourly":
+        raise HTTPException(status_code=400, detail="Use format=binary for hourly data")
+
+    headers = {"X-Series-Dtype": "float32", "X-Series-Byte-Order": "little"}
+    if format == "binary" and resolution == "hourly" and calc.hourly_series is not None:
+        # Serve the stored bytes untouched when the client can take them as-is;
+        # HTTP "deflate" is exactly the zlib format.
+        if calc.series_encoding == series.RAW or (
+            calc.series_encoding == series.ZLIB and "deflate" in request.headers.get("accept-encoding", "")
+        ):
+            if calc.series_encoding == series.ZLIB:
+                headers["Content-Encoding"] = "deflate"
+            headers["X-Series-Shape"] = str(solar.HOURS_PER_YEAR)
+            return Response(content=calc.hourly_series, media_type="application/octet-stream", headers=headers)
+
+    await history.hydrate(session, Calculation, [calc])
+    values = series.hourly(calc)
+    if values is None:
+        raise HTTPException(status_code=404, detail="Calculation has no hourly series")
+    values = series.downsample(values, resolution)
+    if format == "json":
+        return {"project_id": project_id, "version": version, "resolution": resolution, "values": values.round(3).tolist()}
+    headers["X-Series-Shape"] = str(values.size)
+    return Response(content=values.astype(series.DTYPE).tobytes(), media_type="application/octet-stream", headers=headers)
@@ -0,0 +1,54 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.config import settings
+from app.db import get_session
+from app.models import Project, User
+from app.deps import active_user_required
+from app.events import format_sse, hub, project_channel, user_channel
+
+router = APIRouter()
+
+
+async def _get_owned_project(project_id: int, user: User, session: AsyncSession) -> Project:
+    proj = (
+        await session.execute(select(Project).where(Project.id == project_id))
+    ).scalar_one_or_none()
+    if not proj or proj.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return proj
+
+
+@router.get("/{project_id}/events")
+async def project_events(
+    project_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(active_user_required),
+):
+    """Server-sent events for calculations, report status and notifications."""
+    await _get_owned_project(project_id, user, session)
+    channels = (project_channel(project_id), user_channel(user.id))
+
+    async def stream():
+        with hub.subscribe(*channels) as sub:
+            yield "retry: 3000\n: connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event_id, event, data = await asyncio.wait_for(
+                        sub.get(), settings.EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event_id, event, data)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
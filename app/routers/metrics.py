@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.calcs import memo, resource, solar
+from app.db import pool_status
+from app.deps import cache_stats, metrics_access
+from app.events import hub
+from app.executors import calc_executor
+from app.instrumentation import route_metrics
+from app.jobs.reports import report_queue
+from app.jobs.notifications import dispatcher
+from app.jobs.stripe_events import stripe_consumer
+from app.passwords import hash_executor
+
+router = APIRouter(dependencies=[Depends(metrics_access)])
+
+
+@router.get("", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(route_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/cache")
+async def cache_metrics():
+    return {
+        **cache_stats(),
+        "calc_results": memo.result_cache.stats(),
+        "resource_cells": resource.store.stats(),
+        "sun_tables": solar.sun_tables.stats(),
+    }
+
+
+@router.get("/executors")
+async def executor_metrics():
+    return {"calc": calc_executor.stats(), "password_hash": hash_executor.stats()}
+
+
+@router.get("/db")
+async def db_metrics():
+    return pool_status()
+
+
+@router.get("/jobs")
+async def job_metrics():
+    return {
+        "reports": report_queue.stats.as_dict(),
+        "notifications": dispatcher.stats(),
+        "stripe_events": stripe_consumer.stats(),
+    }
+
+
+@router.get("/events")
+async def event_metrics():
+    return hub.stats()
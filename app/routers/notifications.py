@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select
 
 from app.db import get_session
 from app.models import Notification, User
 from app.schemas import NotificationCreate, NotificationOut
 from app.deps import active_user_required
+from app.pagination import PageParams, paginate
+from app.events import hub, user_channel
+from app.jobs.notifications import compute_next_run, dispatcher, utcnow
 
 router = APIRouter()
 
@@ -16,6 +19,11 @@ async def create_notification(
     session: AsyncSession = Depends(get_session),
     user: User = Depends(active_user_required),
 ):
+    now = utcnow()
+    try:
+        next_run_at = compute_next_run(payload.schedule_json, now)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid schedule: {exc}") from exc
     notification = Notification(
         user_id=user.id,
         title=payload.title,
@@ -23,21 +31,27 @@ async def create_notification(
         delivery_channel=payload.delivery_channel,
         schedule_json=payload.schedule_json,
         status="scheduled",
+        next_run_at=next_run_at,
     )
     session.add(notification)
     await session.commit()
     await session.refresh(notification)
+    hub.publish(user_channel(user.id), "notification.created", {
+        "id": notification.id,
+        "title": notification.title,
+        "status": notification.status,
+    })
+    if next_run_at <= now:
+        dispatcher.notify()
     return notification
 
 
 @router.get("", response_model=list[NotificationOut])
 async def list_notifications(
+    response: Response,
+    page: PageParams = Depends(),
     session: AsyncSession = Depends(get_session),
     user: User = Depends(active_user_required),
 ):
-    res = await session.execute(
-        select(Notification)
-        .where(Notification.user_id == user.id)
-        .order_by(desc(Notification.created_at))
-    )
-    return res.scalars().all()
+    stmt = select(Notification).where(Notification.user_id == user.id)
+    return await paginate(session, stmt, Notification, NotificationOut, page, response, scope=user.id)
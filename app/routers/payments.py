@@ -4,13 +4,15 @@ from typing import Any
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 import stripe
 
 from app.config import settings
 from app.db import get_session
 from app.deps import auth_required
-from app.models import Payment, PaymentMethod, User
+from app.jobs.stripe_events import stripe_consumer
+from app.models import Payment, PaymentMethod, StripeEvent, User
 from app.schemas import PaymentCheckoutIn, PaymentMethodOut
 
 router = APIRouter()
@@ -84,6 +86,18 @@ async def create_checkout_session(
     }
 
 
+async def _record_event(session: AsyncSession, event: dict[str, Any]) -> bool:
+    """Insert the event unless its id is already recorded; True when it is new."""
+    insert = postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+    result = await session.execute(
+        insert(StripeEvent)
+        .values(id=event["id"], type=event.get("type") or "", payload_json=event)
+        .on_conflict_do_nothing(index_elements=[StripeEvent.id])
+    )
+    await session.commit()
+    return result.rowcount == 1
+
+
 @router.post("/webhook/stripe")
 async def stripe_webhook(
     request: Request,
@@ -102,46 +116,14 @@ async def stripe_webhook(
         )
     except (ValueError, stripe.error.SignatureVerificationError) as exc:
         raise HTTPException(status_code=400, detail="Invalid Stripe payload") from exc
-
-    if event.get("type") == "checkout.session.completed":
-        data_object: dict[str, Any] = event.get("data", {}).get("object", {})
-        session_id = data_object.get("id")
-        metadata = data_object.get("metadata") or {}
-
-        payment = (
-            await session.execute(
-                select(Payment).where(Payment.external_id == session_id)
-            )
-        ).scalar_one_or_none()
-
-        user: User | None = None
-        if payment:
-            payment.status = "paid"
-            user = (
-                await session.execute(select(User).where(User.id == payment.user_id))
-            ).scalar_one_or_none()
-            if payment.metadata_json is None:
-                payment.metadata_json = metadata
-        else:
-            user_id = metadata.get("user_id")
-            if user_id is not None:
-                user = (
-                    await session.execute(select(User).where(User.id == int(user_id)))
-                ).scalar_one_or_none()
-            if user:
-                payment = Payment(
-                    user_id=user.id,
-                    provider="stripe",
-                    status="paid",
-                    external_id=session_id,
-                    metadata_json=metadata,
-                )
-                session.add(payment)
-
-        if user and not user.is_active:
-            user.is_active = True
-
-        await session.commit()
-
-    return {"received": True}
-
+    if not event.get("id"):
+        raise HTTPException(status_code=400, detail="Invalid Stripe payload")
+
+    # Record and acknowledge; stripe_consumer applies the event in the background.
+    is_new = await _record_event(session, event)
+    if is_new:
+        stripe_consumer.received += 1
+        stripe_consumer.notify()
+    else:
+        stripe_consumer.duplicates += 1
+    return {"received": True, "duplicate": not is_new}
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select
 from app.db import get_session
 from app.models import Project, ProjectInputs, Calculation, User
-from app.schemas import ProjectCreate, ProjectOut, InputsCreate, InputsOut
+from app.schemas import ProjectCreate, ProjectOut, InputsCreate, InputsOut, InputsDiffOut, ImportOut
 from app.deps import active_user_required
+from app.pagination import PageParams, paginate
+from app import export, history, imports
+from app.routers.calcs import calculate_in_background
 
 router = APIRouter()
 
@@ -17,20 +23,80 @@ async def create_project(payload: ProjectCreate, session: AsyncSession = Depends
     return proj
 
 @router.get("", response_model=list[ProjectOut])
-async def list_projects(session: AsyncSession = Depends(get_session), user: User = Depends(active_user_required)):
-    res = await session.execute(select(Project).where(Project.owner_id == user.id).order_by(desc(Project.created_at)))
-    return res.scalars().all()
+async def list_projects(response: Response, page: PageParams = Depends(), session: AsyncSession = Depends(get_session), user: User = Depends(active_user_required)):
+    stmt = select(Project).where(Project.owner_id == user.id)
+    return await paginate(session, stmt, Project, ProjectOut, page, response, scope=user.id)
+
+@router.get("/export")
+async def export_calculations(
+    format: Literal["csv", "parquet"] = Query(default="csv"),
+    scope: Literal["mine", "org"] = Query(default="mine"),
+    project_id: int | None = Query(default=None),
+    user: User = Depends(active_user_required),
+):
+    """Stream every calculation in scope with flattened inputs and results."""
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export requires pyarrow; use format=csv")
+    if scope == "org" and user.org_id is None:
+        raise HTTPException(status_code=400, detail="User does not belong to an organization")
+    if scope == "org" and user.role not in export.ORG_EXPORT_ROLES:
+        raise HTTPException(status_code=403, detail="Organization export requires an organization admin")
+    stmt = export.export_query(
+        owner_id=user.id if scope == "mine" else None,
+        org_id=user.org_id if scope == "org" else None,
+        project_id=project_id,
+    )
+    # The stream opens its own sessions: request dependencies are closed
+    # before the body is sent.
+    return StreamingResponse(
+        export.stream(stmt, format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="calculations.{format}"'},
+    )
+
+@router.post("/import", response_model=ImportOut)
+async def import_projects(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    calculate: bool = Query(default=False),
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(active_user_required),
+):
+    """Create one project with version 1 inputs per valid sheet row."""
+    if imports.is_xlsx(file.filename, file.content_type):
+        if not imports.xlsx_available():
+            raise HTTPException(status_code=400, detail="XLSX import requires openpyxl; upload CSV")
+        rows = imports.read_xlsx(file.file)
+    else:
+        rows = imports.read_csv(file.file)
+    try:
+        project_ids, errors = await imports.import_rows(session, user, rows)
+    except imports.UnreadableUpload as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if calculate and project_ids:
+        background_tasks.add_task(calculate_in_background, user.id, project_ids)
+    return ImportOut(
+        imported=len(project_ids), project_ids=project_ids, errors=errors,
+        calculation_queued=bool(calculate and project_ids),
+    )
 
 @router.post("/{project_id}/inputs", response_model=InputsOut)
 async def save_inputs(project_id: int, payload: InputsCreate, session: AsyncSession = Depends(get_session), user: User = Depends(active_user_required)):
     proj = (await session.execute(select(Project).where(Project.id == project_id))).scalar_one_or_none()
     if not proj or proj.owner_id != user.id:
         raise HTTPException(status_code=404, detail="Project not found")
-    # Versioning: increment last version
-    last = (await session.execute(select(ProjectInputs).where(ProjectInputs.project_id == project_id).order_by(desc(ProjectInputs.version)))).scalars().first()
-    version = (last.version + 1) if last else 1
-    rec = ProjectInputs(project_id=project_id, version=version, payload_json=payload.payload_json)
-    session.add(rec)
-    await session.commit()
-    await session.refresh(rec)
+    # Versioning: the database allocates last version + 1 atomically
+    (rec,) = await history.insert_history(session, ProjectInputs, [{"project_id": project_id, "payload_json": payload.payload_json}])
     return rec
+
+@router.get("/{project_id}/inputs/{v1:int}..{v2:int}/diff", response_model=InputsDiffOut)
+async def diff_inputs(project_id: int, v1: int, v2: int, session: AsyncSession = Depends(get_session), user: User = Depends(active_user_required)):
+    proj = (await session.execute(select(Project).where(Project.id == project_id))).scalar_one_or_none()
+    if not proj or proj.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Project not found")
+    # Each side is rebuilt from its nearest snapshot; versions in between are never read.
+    old = await history.load_version(session, ProjectInputs, project_id, v1)
+    new = await history.load_version(session, ProjectInputs, project_id, v2)
+    if old is None or new is None:
+        raise HTTPException(status_code=404, detail="Inputs version not found")
+    return InputsDiffOut(project_id=project_id, from_version=v1, to_version=v2, patch=history.make_patch(old, new))
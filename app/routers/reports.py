@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select
 
 from app.db import get_session
 from app.models import Project, Report, User
 from app.schemas import ReportRequest, ReportOut
 from app.deps import active_user_required
+from app.pagination import PageParams, paginate
+from app.jobs.reports import publish_status, report_queue
 
 router = APIRouter()
 
@@ -31,24 +36,52 @@ async def generate_report(
         project_id=project_id,
         format=payload.format,
         deliver_to_json=payload.deliver_to,
-        status="prepared",
+        status="queued",
     )
     session.add(report)
     await session.commit()
     await session.refresh(report)
+    # Rendering happens on the report workers, never inside the request.
+    publish_status(report)
+    report_queue.notify()
     return report
 
 
 @router.get("/{project_id}/reports", response_model=list[ReportOut])
 async def list_reports(
     project_id: int,
+    response: Response,
+    page: PageParams = Depends(),
     session: AsyncSession = Depends(get_session),
     user: User = Depends(active_user_required),
 ):
     await _get_owned_project(project_id, user, session)
-    res = await session.execute(
-        select(Report)
-        .where(Report.project_id == project_id)
-        .order_by(desc(Report.created_at))
+    stmt = select(Report).where(Report.project_id == project_id)
+    return await paginate(session, stmt, Report, ReportOut, page, response, scope=user.id)
+
+
+@router.get("/{project_id}/reports/{report_id}/file")
+async def download_report(
+    project_id: int,
+    report_id: int,
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(active_user_required),
+):
+    await _get_owned_project(project_id, user, session)
+    report = (
+        await session.execute(
+            select(Report).where(Report.id == report_id, Report.project_id == project_id)
+        )
+    ).scalar_one_or_none()
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if report.status != "done" or not report.file_path:
+        raise HTTPException(status_code=409, detail=f"Report is {report.status}")
+    # The row outlives the file when REPORTS_DIR is not on persistent storage.
+    if not Path(report.file_path).is_file():
+        raise HTTPException(status_code=410, detail="Report file is no longer available; generate the report again")
+    return FileResponse(
+        report.file_path,
+        media_type="application/pdf",
+        filename=f"report-{report.id}.pdf",
     )
-    return res.scalars().all()
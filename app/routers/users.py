@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select
 
 from app.db import get_session
 from app.models import SocialLink, Dashboard, User
@@ -11,6 +11,7 @@ from app.schemas import (
     DashboardOut,
 )
 from app.deps import active_user_required
+from app.pagination import PageParams, paginate
 
 router = APIRouter()
 
@@ -30,15 +31,13 @@ async def create_social_link(
 
 @router.get("/social-links", response_model=list[SocialLinkOut])
 async def list_social_links(
+    response: Response,
+    page: PageParams = Depends(),
     session: AsyncSession = Depends(get_session),
     user: User = Depends(active_user_required),
 ):
-    res = await session.execute(
-        select(SocialLink)
-        .where(SocialLink.user_id == user.id)
-        .order_by(desc(SocialLink.created_at))
-    )
-    return res.scalars().all()
+    stmt = select(SocialLink).where(SocialLink.user_id == user.id)
+    return await paginate(session, stmt, SocialLink, SocialLinkOut, page, response, scope=user.id)
 
 
 @router.post("/dashboards", response_model=DashboardOut)
@@ -61,13 +60,13 @@ async def create_dashboard(
 
 @router.get("/dashboards", response_model=list[DashboardOut])
 async def list_dashboards(
+    response: Response,
     preference: str | None = None,
+    page: PageParams = Depends(),
     session: AsyncSession = Depends(get_session),
     user: User = Depends(active_user_required),
 ):
     stmt = select(Dashboard).where(Dashboard.user_id == user.id)
     if preference:
         stmt = stmt.where(Dashboard.preference == preference)
-    stmt = stmt.order_by(desc(Dashboard.created_at))
-    res = await session.execute(stmt)
-    return res.scalars().all()
+    return await paginate(session, stmt, Dashboard, DashboardOut, page, response, scope=user.id)
@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select
 
 from app.db import get_session
 from app.models import Project, Visualization, User
 from app.schemas import VisualizationCreate, VisualizationOut
 from app.deps import active_user_required
+from app.pagination import PageParams, paginate
 
 router = APIRouter()
 
@@ -41,13 +42,11 @@ async def create_visualization(
 @router.get("/{project_id}/visualizations", response_model=list[VisualizationOut])
 async def list_visualizations(
     project_id: int,
+    response: Response,
+    page: PageParams = Depends(),
     session: AsyncSession = Depends(get_session),
     user: User = Depends(active_user_required),
 ):
     await _get_owned_project(project_id, user, session)
-    res = await session.execute(
-        select(Visualization)
-        .where(Visualization.project_id == project_id)
-        .order_by(desc(Visualization.created_at))
-    )
-    return res.scalars().all()
+    stmt = select(Visualization).where(Visualization.project_id == project_id)
+    return await paginate(session, stmt, Visualization, VisualizationOut, page, response, scope=user.id)
@@ -1,4 +1,5 @@
-from pydantic import BaseModel, EmailStr, field_validator, model_validator
+from pydantic import AliasChoices, BaseModel, EmailStr, Field, field_validator, model_validator
+from datetime import datetime
 from typing import Optional, Literal
 
 
@@ -95,14 +96,108 @@ class InputsOut(BaseModel):
     class Config:
         from_attributes = True
 
+class InputsDiffOut(BaseModel):
+    project_id: int
+    from_version: int
+    to_version: int
+    patch: list[dict]
+
 class CalcResultOut(BaseModel):
     id: int
     project_id: int
     version: int
     results_json: dict
+    cache_hit: bool = False
     class Config:
         from_attributes = True
 
+MAX_BATCH_PROJECTS = 500
+
+class BatchCalcIn(BaseModel):
+    project_ids: list[int] = Field(min_length=1, max_length=MAX_BATCH_PROJECTS)
+
+class BatchCalcError(BaseModel):
+    project_id: int
+    detail: str
+
+class BatchCalcOut(BaseModel):
+    results: list[CalcResultOut]
+    errors: list[BatchCalcError]
+
+class ImportRow(BaseModel):
+    """One spreadsheet row of POST /projects/import; columns match the export."""
+    name: str = Field(min_length=1, max_length=200, validation_alias=AliasChoices("name", "project_name"))
+    currency: str = Field(default="USD", max_length=10)
+    lat: Optional[float] = Field(default=None, ge=-90, le=90)
+    lon: Optional[float] = Field(default=None, ge=-180, le=180)
+    tilt: Optional[float] = Field(default=None, ge=0, le=90)
+    azimuth: Optional[float] = Field(default=None, ge=0, le=360)
+    panel_watts: Optional[float] = Field(default=None, gt=0)
+    num_panels: Optional[int] = Field(default=None, gt=0)
+    losses_pct: Optional[float] = Field(default=None, ge=0, lt=100)
+    inverter_efficiency_pct: Optional[float] = Field(default=None, gt=0, le=100)
+    inverter_ac_kw: Optional[float] = Field(default=None, gt=0)
+    demand_annual_kwh: Optional[float] = Field(default=None, ge=0)
+
+    @field_validator("*", mode="before")
+    @classmethod
+    def spreadsheet_cell(cls, v, info):
+        # Strip text and treat empty cells as missing; numeric cells are fine as names.
+        if isinstance(v, str):
+            v = v.strip() or None
+        if info.field_name in ("name", "currency") and isinstance(v, (int, float)):
+            v = str(v)
+        if info.field_name == "currency" and v is None:
+            v = "USD"
+        return v
+
+class ImportRowError(BaseModel):
+    row: int
+    detail: str
+
+class ImportOut(BaseModel):
+    imported: int
+    project_ids: list[int]
+    errors: list[ImportRowError]
+    calculation_queued: bool
+
+class SweepRange(BaseModel):
+    start: float = Field(allow_inf_nan=False)
+    stop: float = Field(allow_inf_nan=False)
+    step: float = Field(default=1.0, gt=0, allow_inf_nan=False)
+
+    @model_validator(mode="after")
+    def stop_not_below_start(self):
+        if self.stop < self.start:
+            raise ValueError("stop must be greater than or equal to start")
+        return self
+
+class OptimizeIn(BaseModel):
+    num_panels: Optional[SweepRange] = None
+    panel_watts: Optional[SweepRange] = None
+    tilt: Optional[SweepRange] = None
+    azimuth: Optional[SweepRange] = None
+    objective: Literal["cover_demand_min_dc", "max_energy"] = "cover_demand_min_dc"
+    target_kwh: Optional[float] = Field(default=None, gt=0)
+
+class OptimizeCandidate(BaseModel):
+    num_panels: int
+    panel_watts: float
+    dc_kw: float
+    tilt: float
+    azimuth: float
+    annual_kwh: float
+    kwh_per_kwdc: float
+    coverage_pct: Optional[float] = None
+
+class OptimizeOut(BaseModel):
+    objective: str
+    target_kwh: Optional[float] = None
+    meets_target: bool
+    evaluated: dict
+    best: OptimizeCandidate
+    pareto_front: list[OptimizeCandidate]
+
 
 class VisualizationCreate(BaseModel):
     chart_type: str
@@ -130,6 +225,7 @@ class ReportOut(BaseModel):
     format: str
     deliver_to_json: dict
     status: str
+    error: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -163,6 +259,8 @@ class NotificationOut(BaseModel):
     delivery_channel: str
     status: str
     schedule_json: Optional[dict]
+    next_run_at: Optional[datetime] = None
+    sent_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,42 @@
+"""Race-free version numbering for per-project history tables.
+
+The next version is computed inside the INSERT itself
+(``INSERT ... VALUES (..., (SELECT max(version) + 1 ...))``), so there is no
+read-then-write window in application code. Two writers that still collide
+on Postgres trip the unique ``(project_id, version)`` constraint, and the
+loser retries with a fresh statement.
+"""
+
+from typing import Any
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+MAX_ATTEMPTS = 5
+
+
+def next_version(model, project_id: int):
+    return (
+        select(func.coalesce(func.max(model.version), 0) + 1)
+        .where(model.project_id == project_id)
+        .scalar_subquery()
+    )
+
+
+async def insert_versioned(session: AsyncSession, model, rows: list[dict[str, Any]]) -> list:
+    """Insert one row per project with atomically allocated versions and commit.
+
+    Returns the inserted ORM objects. Rows must target distinct projects.
+    """
+    values = [{**row, "version": next_version(model, row["project_id"])} for row in rows]
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            inserted = list(await session.scalars(insert(model).values(values).returning(model)))
+            await session.commit()
+            return inserted
+        except IntegrityError:
+            await session.rollback()
+            if attempt == MAX_ATTEMPTS:
+                raise
+    return []
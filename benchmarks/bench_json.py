@@ -0,0 +1,92 @@
+"""Compare default and fast JSON serialization of list responses.
+
+Usage: python -m benchmarks.bench_json [--rows 200] [--repeat 20]
+
+"default" mirrors what FastAPI does for ``response_model=list[Schema]``:
+validate from attributes, dump to Python dicts, encode with ``json.dumps``.
+"fast" is the FAST_JSON path: validate once and let pydantic-core write the
+bytes (``app.responses.dump_list``).
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime
+
+from pydantic import TypeAdapter
+
+from app.models import Project, Visualization
+from app.responses import dump_list
+from app.schemas import ProjectOut, VisualizationOut
+
+
+def make_projects(count: int) -> list[Project]:
+    site = {
+        "lat": 32.1, "lon": 34.8, "address": "Rooftop array, north wing",
+        "roof_segments": [{"id": i, "area_m2": 42.5, "outline": [[j * 0.1, j * 0.2] for j in range(40)]} for i in range(6)],
+    }
+    return [
+        Project(
+            id=i, owner_id=1, org_id=None, name=f"Project {i}", site_location_json=site,
+            currency="USD", status="draft", created_at=datetime(2024, 5, 1, 12, 0, i % 60),
+        )
+        for i in range(count)
+    ]
+
+
+def make_visualizations(count: int) -> list[Visualization]:
+    config = {
+        "series": [round(i * 0.37, 3) for i in range(8760)],
+        "labels": [f"h{i}" for i in range(0, 8760, 24)],
+        "options": {"stacked": False, "colors": ["#f5a623", "#4a90e2"]},
+    }
+    return [
+        Visualization(
+            id=i, project_id=1, chart_type="generation_curve", config_json=config,
+            created_at=datetime(2024, 5, 1, 12, 0, i % 60),
+        )
+        for i in range(count)
+    ]
+
+
+def default_path(schema, rows) -> bytes:
+    adapter = TypeAdapter(list[schema])
+    content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(schema, rows) -> bytes:
+    return dump_list(schema, rows)
+
+
+def timed(fn, schema, rows, repeat: int) -> list[float]:
+    fn(schema, rows)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(schema, rows)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cases = [
+        ("list_projects", ProjectOut, make_projects(args.rows)),
+        ("list_visualizations", VisualizationOut, make_visualizations(min(args.rows, 50))),
+    ]
+    print(f"{'endpoint':<22}{'rows':>6}{'default ms':>12}{'fast ms':>10}{'speedup':>9}")
+    for name, schema, rows in cases:
+        assert json.loads(default_path(schema, rows)) == json.loads(fast_path(schema, rows))
+        slow = statistics.median(timed(default_path, schema, rows, args.repeat))
+        fast = statistics.median(timed(fast_path, schema, rows, args.repeat))
+        print(f"{name:<22}{len(rows):>6}{slow:>12.2f}{fast:>10.2f}{slow / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Measure the sun-table layer: startup cost and per-call savings.
+
+Usage: python -m benchmarks.bench_sun_tables [--repeat 200]
+
+* build: first use of a latitude bucket (compute + save ``.npy``);
+* map: a fresh process/store memory-mapping the saved file;
+* per call: ``solar.calculate`` with warm tables against the same model
+  recomputing sun geometry and clear-sky arrays on every call.
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.calcs import solar
+from app.calcs.sun_tables import SunTableStore
+from app.config import settings
+
+INPUTS = {
+    "site": {"lat": 32.08, "lon": 34.78, "tilt": 25, "azimuth": 180},
+    "pv": {"panel_watts": 550, "num_panels": 14, "losses_pct": 14},
+    "inverter": {"efficiency_pct": 97, "ac_kw": 6},
+}
+
+
+def recomputed_profile(params: dict) -> np.ndarray:
+    """The engine's hot path before sun tables: trigonometry on every call."""
+    cos_z, north, east = solar._sun_geometry(params["lat"])
+    dni, dhi, ghi = solar._clear_sky(cos_z)
+    poa = params["clearness"] * solar._plane_of_array(
+        cos_z, north, east, dni, dhi, ghi, params["tilt"], params["azimuth"]
+    )
+    t_cell = solar._ambient_temperature(params["lat"]) + (solar.NOCT_C - 20.0) / 800.0 * poa
+    derate = (1.0 + params["temp_coeff"] * (t_cell - 25.0)) * (1.0 - params["system_losses"]) * params["inverter_eff"]
+    return np.maximum(poa / 1000.0 * derate, 0.0)
+
+
+def tabled_profile(params: dict) -> np.ndarray:
+    return solar.ac_per_kw_profiles(params, params["tilt"], params["azimuth"])
+
+
+def per_call_ms(fn, params: dict, repeat: int) -> float:
+    fn(params)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(params)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="sun-tables-bench-")
+    store = SunTableStore(directory, settings.SUN_TABLE_LAT_STEP, 8, solar._build_sun_table, solar.ENGINE_VERSION)
+    start = time.perf_counter()
+    store.get(INPUTS["site"]["lat"])
+    build_ms = (time.perf_counter() - start) * 1000
+
+    fresh = SunTableStore(directory, settings.SUN_TABLE_LAT_STEP, 8, solar._build_sun_table, solar.ENGINE_VERSION)
+    start = time.perf_counter()
+    fresh.get(INPUTS["site"]["lat"])
+    map_ms = (time.perf_counter() - start) * 1000
+
+    params = solar._parameters(INPUTS)
+    # Tables hold the bucket latitude's geometry, so compare at that latitude.
+    params["lat"] = store.get(params["lat"]).lat
+    assert np.allclose(recomputed_profile(params), tabled_profile(params), atol=1e-6)
+    before = per_call_ms(recomputed_profile, params, args.repeat)
+    after = per_call_ms(tabled_profile, params, args.repeat)
+    calculate = per_call_ms(lambda _: solar.calculate(INPUTS), params, args.repeat)
+
+    print(f"table build + save (first use of a bucket): {build_ms:8.2f} ms")
+    print(f"table memory-map (other workers, restarts):  {map_ms:8.2f} ms")
+    print(f"hourly profile, recomputed geometry:         {before:8.3f} ms/call")
+    print(f"hourly profile, sun tables:                  {after:8.3f} ms/call  ({before / after:.1f}x)")
+    print(f"solar.calculate end to end:                  {calculate:8.3f} ms/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,9 @@ import time
 from pathlib import Path
 from uuid import uuid4
 
+import numpy as np
 import pytest
+import tempfile
 from fastapi.testclient import TestClient
 
 TEST_DB_URL = "sqlite+aiosqlite:///./test.db"
@@ -15,6 +17,11 @@ os.environ["DATABASE_URL"] = TEST_DB_URL
 os.environ["STRIPE_SECRET_KEY"] = "sk_test_123"
 os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_test"
 os.environ["FRONTEND_DOMAIN"] = "https://frontend.test"
+os.environ["METRICS_TOKEN"] = "metrics-test-token"
+METRICS_HEADERS = {"Authorization": "Bearer metrics-test-token"}
+os.environ["REPORTS_DIR"] = tempfile.mkdtemp(prefix="solar-reports-")
+os.environ["RESOURCE_DIR"] = tempfile.mkdtemp(prefix="solar-resource-")
+os.environ["SUN_TABLE_DIR"] = tempfile.mkdtemp(prefix="solar-sun-")
 
 TEST_DB_PATH = Path("./test.db")
 if TEST_DB_PATH.exists():
@@ -25,7 +32,7 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 from app.main import app  # noqa: E402
-from app.calcs import solar  # noqa: E402
+from app.calcs import series, solar  # noqa: E402
 
 
 @pytest.fixture(autouse=True)
@@ -57,9 +64,11 @@ def client():
         TEST_DB_PATH.unlink()
 
 
-def trigger_stripe_completion(client: TestClient, *, user_id: int, session_id: str) -> None:
+def trigger_stripe_completion(
+    client: TestClient, *, user_id: int, session_id: str, event_id: str | None = None
+) -> dict:
     event = {
-        "id": f"evt_{uuid4().hex}",
+        "id": event_id or f"evt_{uuid4().hex}",
         "object": "event",
         "type": "checkout.session.completed",
         "data": {
@@ -85,6 +94,19 @@ def trigger_stripe_completion(client: TestClient, *, user_id: int, session_id: s
         },
     )
     assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def wait_until_active(client: TestClient, headers: dict[str, str], timeout: float = 5.0) -> None:
+    """Webhook events are applied in the background; poll until activation lands."""
+    deadline = time.monotonic() + timeout
+    while True:
+        me = client.get("/auth/me", headers=headers)
+        assert me.status_code == 200
+        if me.json()["is_active"] is True:
+            return
+        assert time.monotonic() < deadline, "user was not activated"
+        time.sleep(0.01)
 
 
 def create_auth_header(
@@ -130,9 +152,7 @@ def create_auth_header(
         trigger_stripe_completion(
             client, user_id=user_data["id"], session_id=session_id
         )
-        me_resp = client.get("/auth/me", headers=headers)
-        assert me_resp.status_code == 200
-        assert me_resp.json()["is_active"] is True
+        wait_until_active(client, headers)
     return headers
 
 
@@ -219,8 +239,9 @@ def test_project_flow_with_calculation(client: TestClient):
     calculation = calc_resp.json()
     assert calculation["version"] == 1
 
-    expected = solar.calculate(inputs_v2["payload_json"])
+    expected = series.split(solar.calculate(inputs_v2["payload_json"]))["results_json"]
     assert calculation["results_json"] == expected
+    assert "hourly_kwh" not in calculation["results_json"]
 
     viz_payload = {
         "chart_type": "generation_curve",
@@ -253,11 +274,34 @@ def test_project_flow_with_calculation(client: TestClient):
     assert report["format"] == "pdf"
     assert report["deliver_to_json"]["email"] == "owner@example.com"
 
-    reports_list = client.get(
-        f"/projects/{project_id}/reports", headers=headers
+    assert report["status"] == "queued"
+
+    deadline = time.time() + 10
+    while True:
+        reports_list = client.get(
+            f"/projects/{project_id}/reports", headers=headers
+        )
+        assert reports_list.status_code == 200
+        listed = next(r for r in reports_list.json() if r["id"] == report["id"])
+        if listed["status"] == "done" or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert listed["status"] == "done", listed
+    pdf = client.get(
+        f"/projects/{project_id}/reports/{report['id']}/file", headers=headers
     )
-    assert reports_list.status_code == 200
-    assert any(r["id"] == report["id"] for r in reports_list.json())
+    assert pdf.status_code == 200
+    assert pdf.headers["content-type"] == "application/pdf"
+    assert pdf.content.startswith(b"%PDF-1.4")
+    assert b"Solar Roof" in pdf.content
+    import sqlite3
+
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        (file_path,) = conn.execute("SELECT file_path FROM reports WHERE id = ?", (report["id"],)).fetchone()
+    os.remove(file_path)  # e.g. a redeploy without a reports volume
+    gone = client.get(f"/projects/{project_id}/reports/{report['id']}/file", headers=headers)
+    assert gone.status_code == 410
+    assert client.get("/metrics/jobs", headers=METRICS_HEADERS).json()["reports"]["done"] >= 1
 
     payment_resp = client.get("/payments/me", headers=headers)
     assert payment_resp.status_code == 200
@@ -331,3 +375,1090 @@ def test_payment_mobile_money_option(client: TestClient):
     payment = payment_resp.json()
     assert payment["method_type"] == "mobile_money"
     assert payment["details_json"]["phone_number"] == "+250700000001"
+
+
+def test_solar_hourly_engine_profiles():
+    inputs = {
+        "site": {"lat": 32.1, "lon": 34.8, "tilt": 25, "azimuth": 180},
+        "pv": {"panel_watts": 550, "num_panels": 10, "losses_pct": 14},
+        "inverter": {"efficiency_pct": 97},
+    }
+    results = solar.calculate(inputs)
+    assert {"dc_kw", "kwh_per_kwdc", "est_annual_kwh", "notes"} <= results.keys()
+    assert results["dc_kw"] == 5.5
+    assert len(results["monthly_kwh"]) == 12
+    assert len(results["hourly_kwh"]) == 8760
+    assert sum(results["monthly_kwh"]) == pytest.approx(results["est_annual_kwh"], abs=1)
+    assert 1000 < results["kwh_per_kwdc"] < 2200
+    # Summer beats winter in the northern hemisphere; night hours are dark.
+    assert results["monthly_kwh"][5] > results["monthly_kwh"][11]
+    assert results["hourly_kwh"][0] == 0
+
+    clipped = solar.calculate({**inputs, "inverter": {"efficiency_pct": 97, "ac_kw": 3}})
+    assert max(clipped["hourly_kwh"]) <= 3
+    assert clipped["est_annual_kwh"] < results["est_annual_kwh"]
+
+    # Unusable site values fall back to the default site, as before the site was modelled.
+    default_site = solar.calculate({"pv": inputs["pv"]})
+    for site in ({"lat": None}, "tel aviv", {"lat": "north", "tilt": float("nan")}, {"lat": 400}):
+        assert solar.calculate({"pv": inputs["pv"], "site": site})["est_annual_kwh"] == default_site["est_annual_kwh"]
+    with pytest.raises(ValueError, match="pv.panel_watts"):
+        solar.calculate({"pv": {"panel_watts": "abc", "num_panels": 2}})
+
+
+def test_calculate_rejects_unusable_inputs_with_400(client: TestClient):
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Odd inputs"}, headers=headers).json()["id"]
+    client.post(f"/projects/{project_id}/inputs", json={"payload_json": {"site": "tel aviv", "pv": {"num_panels": 2}}}, headers=headers)
+    assert client.post(f"/projects/{project_id}/calculate", headers=headers).status_code == 200
+    client.post(f"/projects/{project_id}/inputs", json={"payload_json": {"pv": {"panel_watts": "abc"}}}, headers=headers)
+    resp = client.post(f"/projects/{project_id}/calculate", headers=headers)
+    assert resp.status_code == 400 and "pv.panel_watts" in resp.json()["detail"]
+
+
+def test_solar_engine_latency_budget():
+    inputs = {"pv": {"panel_watts": 500, "num_panels": 20}}
+    solar.calculate(inputs)
+    start = time.perf_counter()
+    for _ in range(20):
+        solar.calculate(inputs)
+    per_call_ms = (time.perf_counter() - start) / 20 * 1000
+    assert per_call_ms < 10
+
+
+def test_batch_calculation(client: TestClient):
+    headers = create_auth_header(client)
+    other_headers = create_auth_header(client)
+    project_ids = []
+    for idx in range(3):
+        resp = client.post("/projects", json={"name": f"Site {idx}"}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        project_ids.append(resp.json()["id"])
+    foreign = client.post("/projects", json={"name": "Not mine"}, headers=other_headers).json()["id"]
+    inputs = {}
+    for idx, project_id in enumerate(project_ids[:2]):
+        inputs[project_id] = {"pv": {"panel_watts": 400 + idx * 50, "num_panels": 12}}
+        resp = client.post(
+            f"/projects/{project_id}/inputs",
+            json={"payload_json": inputs[project_id]},
+            headers=headers,
+        )
+        assert resp.status_code == 200, resp.text
+
+    batch = {"project_ids": project_ids + [foreign]}
+    resp = client.post("/projects/calculate:batch", json=batch, headers=headers)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert sorted(r["project_id"] for r in body["results"]) == sorted(project_ids[:2])
+    for result in body["results"]:
+        assert result["version"] == 1
+        assert result["results_json"] == series.split(solar.calculate(inputs[result["project_id"]]))["results_json"]
+    assert {e["project_id"]: e["detail"] for e in body["errors"]} == {
+        project_ids[2]: "No inputs found for project",
+        foreign: "Project not found",
+    }
+
+    again = client.post("/projects/calculate:batch", json=batch, headers=headers).json()
+    assert [(r["version"], r["cache_hit"]) for r in again["results"]] == [(1, True), (1, True)]
+
+    changed = {"pv": {"panel_watts": 600, "num_panels": 12}}
+    client.post(
+        f"/projects/{project_ids[0]}/inputs",
+        json={"payload_json": changed},
+        headers=headers,
+    )
+    third = client.post("/projects/calculate:batch", json=batch, headers=headers).json()
+    by_project = {r["project_id"]: r for r in third["results"]}
+    assert by_project[project_ids[0]]["version"] == 2
+    assert by_project[project_ids[0]]["cache_hit"] is False
+    assert by_project[project_ids[1]]["version"] == 1
+
+
+def test_stale_report_is_failed_after_max_attempts(client: TestClient):
+    import sqlite3
+
+    from app.config import settings
+    from app.jobs.reports import report_queue
+
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Crashy"}, headers=headers).json()["id"]
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        report_id = conn.execute(
+            "INSERT INTO reports (project_id, format, deliver_to_json, status, attempts, started_at, created_at, updated_at)"
+            " VALUES (?, 'pdf', '{}', 'rendering', ?, '2000-01-01 00:00:00', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)",
+            (project_id, settings.REPORT_MAX_ATTEMPTS),
+        ).lastrowid
+    report_queue.notify()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        listed = {r["id"]: r for r in client.get(f"/projects/{project_id}/reports", headers=headers).json()}
+        if listed[report_id]["status"] != "rendering":
+            break
+        time.sleep(0.05)
+    assert listed[report_id]["status"] == "failed"
+    assert "attempts" in listed[report_id]["error"]
+
+
+def test_batch_calculation_reports_engine_errors_per_project(client: TestClient):
+    headers = create_auth_header(client)
+    good, bad = (client.post("/projects", json={"name": name}, headers=headers).json()["id"] for name in ("Good", "Bad"))
+    client.post(f"/projects/{good}/inputs", json={"payload_json": {"pv": {"panel_watts": 410, "num_panels": 9}}}, headers=headers)
+    client.post(f"/projects/{bad}/inputs", json={"payload_json": {"pv": {"panel_watts": "abc"}}}, headers=headers)
+    resp = client.post("/projects/calculate:batch", json={"project_ids": [good, bad]}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert [r["project_id"] for r in body["results"]] == [good]
+    assert [e["project_id"] for e in body["errors"]] == [bad]
+    assert "pv.panel_watts" in body["errors"][0]["detail"]
+    assert client.get(f"/projects/{good}/calculations/1/series", headers=headers).status_code == 200
+
+
+def test_calculation_memoized_by_inputs_hash(client: TestClient):
+    from app.calcs import memo
+
+    headers = create_auth_header(client)
+    payload = {"pv": {"panel_watts": 455, "num_panels": 17}, "site": {"lat": 40.0}}
+    reordered = {"site": {"lat": 40.0}, "pv": {"num_panels": 17, "panel_watts": 455}}
+    assert memo.inputs_hash(payload) == memo.inputs_hash(reordered)
+
+    first_project = client.post("/projects", json={"name": "A"}, headers=headers).json()["id"]
+    second_project = client.post("/projects", json={"name": "B"}, headers=headers).json()["id"]
+    client.post(f"/projects/{first_project}/inputs", json={"payload_json": payload}, headers=headers)
+    client.post(f"/projects/{second_project}/inputs", json={"payload_json": reordered}, headers=headers)
+
+    first = client.post(f"/projects/{first_project}/calculate", headers=headers).json()
+    assert first["cache_hit"] is False
+    repeat = client.post(f"/projects/{first_project}/calculate", headers=headers).json()
+    assert repeat["cache_hit"] is True
+    assert repeat["id"] == first["id"]
+
+    # Persisted lookup still skips the engine once the in-process LRU is cold.
+    memo.result_cache.clear()
+    other = client.post(f"/projects/{second_project}/calculate", headers=headers).json()
+    assert other["cache_hit"] is True
+    assert other["id"] != first["id"]
+    assert other["results_json"] == first["results_json"]
+
+
+def test_bounded_executor_backpressure_and_timeout():
+    import asyncio
+    import threading
+
+    from app.executors import BoundedExecutor, ExecutorBusy, ExecutorTimeout
+
+    async def scenario():
+        release = threading.Event()
+        executor = BoundedExecutor("test", "thread", max_workers=1, max_queue=1, timeout=5)
+        blocked = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(ExecutorBusy):
+            await executor.run(time.sleep, 0)
+        release.set()
+        await asyncio.gather(*blocked)
+        with pytest.raises(ExecutorTimeout):
+            await executor.run(time.sleep, 0.5, timeout=0.05)
+        await executor.shutdown()
+        assert executor.stats()["rejected"] == 1
+        assert executor.stats()["timed_out"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_process_executor_runs_engine():
+    import asyncio
+
+    from app.executors import BoundedExecutor
+
+    inputs = {"pv": {"panel_watts": 500, "num_panels": 4}}
+
+    async def scenario():
+        executor = BoundedExecutor("test", "process", max_workers=1, max_queue=0, timeout=60)
+        try:
+            return await executor.run(solar.calculate, inputs)
+        finally:
+            await executor.shutdown()
+
+    remote, local = asyncio.run(scenario()), solar.calculate(inputs)
+    assert np.array_equal(remote.pop("hourly_kwh"), local.pop("hourly_kwh"))
+    assert remote == local
+
+
+def test_user_cache_saves_lookups_and_invalidates_on_activation(client: TestClient):
+    headers = create_auth_header(client, activate=False)
+    before = client.get("/metrics/cache", headers=METRICS_HEADERS).json()["users"]
+    for _ in range(5):
+        assert client.get("/auth/me", headers=headers).json()["is_active"] is False
+    after = client.get("/metrics/cache", headers=METRICS_HEADERS).json()["users"]
+    assert after["db_queries_saved"] - before["db_queries_saved"] >= 4
+
+    # Activation through the Stripe webhook must evict the cached row.
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    session_id = client.post(
+        "/payments/checkout", json={"provider": "stripe"}, headers=headers
+    ).json()["session_id"]
+    trigger_stripe_completion(client, user_id=user_id, session_id=session_id)
+    wait_until_active(client, headers)
+    assert client.get("/projects", headers=headers).status_code == 200
+
+
+def test_login_rehashes_password_when_argon2_params_change(client: TestClient, monkeypatch):
+    import sqlite3
+
+    from argon2 import PasswordHasher
+    from app import passwords
+
+    email = f"rehash_{uuid4().hex}@example.com"
+    register = client.post(
+        "/auth/register",
+        json={
+            "name": "Rehash",
+            "email": email,
+            "password": "Secret123",
+            "payment": {"method": "visa", "card_number": "4111111111111111"},
+        },
+    )
+    assert register.status_code == 200, register.text
+
+    def stored_hash() -> str:
+        with sqlite3.connect(TEST_DB_PATH) as conn:
+            return conn.execute(
+                "SELECT password_hash FROM users WHERE email = ?", (email,)
+            ).fetchone()[0]
+
+    assert "m=65536" in stored_hash()
+    monkeypatch.setattr(passwords, "ph", PasswordHasher(time_cost=2, memory_cost=8192, parallelism=1))
+    login = client.post("/auth/login", json={"email": email, "password": "Secret123"})
+    assert login.status_code == 200, login.text
+    assert "m=8192,t=2,p=1" in stored_hash()
+
+    wrong = client.post("/auth/login", json={"email": email, "password": "nope"})
+    assert wrong.status_code == 401
+
+
+def test_pool_settings_and_metrics(client: TestClient):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.db import InstrumentedPool, engine_options
+
+    url = "postgresql+psycopg://solar:solar@db:5432/solar"
+    options = engine_options(url)
+    assert options["poolclass"] is InstrumentedPool
+    assert options["pool_pre_ping"] is True
+    assert options["connect_args"] == {"prepare_threshold": 5}
+    pg_engine = create_async_engine(url, **options)
+    assert pg_engine.sync_engine.pool.size() == options["pool_size"]
+    assert "poolclass" not in engine_options("sqlite+aiosqlite:///./x.db")
+
+    client.get("/health")
+    resp = client.get("/metrics/db", headers=METRICS_HEADERS)
+    assert resp.status_code == 200
+    stats = resp.json()
+    assert stats["checkouts"] > 0
+    assert stats["checked_out"] >= 0
+
+
+def test_keyset_pagination_and_field_projection(client: TestClient):
+    headers = create_auth_header(client)
+    created = []
+    for idx in range(7):
+        resp = client.post(
+            "/projects",
+            json={"name": f"Paged {idx}", "site_location_json": {"lat": idx}},
+            headers=headers,
+        )
+        created.append(resp.json()["id"])
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/projects", headers=headers, params=params)
+        assert resp.status_code == 200, resp.text
+        seen.extend(p["id"] for p in resp.json())
+        pages += 1
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert pages == 3
+    assert seen == sorted(created, reverse=True)
+
+    projected = client.get(
+        "/projects", headers=headers, params={"fields": "id,name", "limit": 2}
+    )
+    assert projected.status_code == 200
+    assert projected.json() == [
+        {"id": created[-1], "name": "Paged 6"},
+        {"id": created[-2], "name": "Paged 5"},
+    ]
+    assert projected.headers.get("X-Next-Cursor")
+
+    notification = client.post(
+        "/notifications", json={"title": "Later", "message": "x", "schedule_json": {"hours": 2}}, headers=headers,
+    ).json()
+    dated = client.get("/notifications", headers=headers, params={"fields": "id,next_run_at"})
+    assert dated.status_code == 200, dated.text
+    assert dated.json() == [{"id": notification["id"], "next_run_at": notification["next_run_at"]}]
+
+    bad = client.get("/projects", headers=headers, params={"fields": "password"})
+    assert bad.status_code == 400
+    assert client.get("/projects", headers=headers, params={"cursor": "nope"}).status_code == 400
+
+
+def _query_plan(stmt) -> list[str]:
+    import sqlite3
+
+    from sqlalchemy.dialects import sqlite as sqlite_dialect
+
+    sql = str(
+        stmt.compile(dialect=sqlite_dialect.dialect(), compile_kwargs={"literal_binds": True})
+    )
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def test_hot_lookups_use_indexes(client: TestClient):
+    from datetime import datetime
+
+    from sqlalchemy import and_, desc, or_, select
+
+    from app import history
+    from app.models import (
+        Calculation,
+        Dashboard,
+        Notification,
+        Project,
+        ProjectInputs,
+        Report,
+        SocialLink,
+        Visualization,
+    )
+
+    client.get("/health")
+    # The latest-version lookups exactly as run_calc, run_optimize, the batch path and the report worker build them.
+    stmts = [history.latest(model, 1) for model in (ProjectInputs, Calculation)]
+    assert all("LIMIT" in str(stmt) for stmt in stmts)
+    stmts += [history.latest_versions(model, [1, 2, 3]) for model in (ProjectInputs, Calculation)]
+    cursor_ts = datetime(2030, 1, 1)
+    for model, owner_col in (
+        (Project, Project.owner_id),
+        (Report, Report.project_id),
+        (Visualization, Visualization.project_id),
+        (Notification, Notification.user_id),
+        (SocialLink, SocialLink.user_id),
+        (Dashboard, Dashboard.user_id),
+    ):
+        stmts.append(
+            select(model)
+            .where(owner_col == 1)
+            .where(or_(model.created_at < cursor_ts, and_(model.created_at == cursor_ts, model.id < 10)))
+            .order_by(desc(model.created_at), desc(model.id))
+            .limit(51)
+        )
+    for stmt in stmts:
+        plan = _query_plan(stmt)
+        assert not any("TEMP B-TREE" in step for step in plan), plan
+        assert all("INDEX" in step for step in plan if step.startswith(("SCAN", "SEARCH"))), plan
+
+
+def test_concurrent_input_saves_get_distinct_versions(client: TestClient):
+    from concurrent.futures import ThreadPoolExecutor
+
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Race"}, headers=headers).json()["id"]
+
+    def save(idx: int) -> int:
+        resp = client.post(
+            f"/projects/{project_id}/inputs",
+            json={"payload_json": {"pv": {"panel_watts": 400 + idx, "num_panels": 10}}},
+            headers=headers,
+        )
+        assert resp.status_code == 200, resp.text
+        return resp.json()["version"]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        versions = list(pool.map(save, range(8)))
+    assert sorted(versions) == list(range(1, 9))
+
+
+def test_event_hub_fans_out_project_events(client: TestClient):
+    from app.events import EventHub, format_sse, hub, project_channel, user_channel
+
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Live"}, headers=headers).json()["id"]
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    client.post(
+        f"/projects/{project_id}/inputs",
+        json={"payload_json": {"pv": {"panel_watts": 300, "num_panels": 3}}},
+        headers=headers,
+    )
+
+    with hub.subscribe(project_channel(project_id), user_channel(user_id)) as sub:
+        calc = client.post(f"/projects/{project_id}/calculate", headers=headers).json()
+        client.post(
+            "/notifications",
+            json={"title": "Heads up", "message": "Calc done"},
+            headers=headers,
+        )
+        events = []
+        while not sub.queue.empty():
+            events.append(sub.queue.get_nowait())
+    assert [(name, data.get("id")) for _, name, data in events] == [
+        ("calculation.created", calc["id"]),
+        ("notification.created", events[1][2]["id"]),
+    ]
+    assert format_sse(*events[0]).startswith(f"id: {events[0][0]}\nevent: calculation.created\n")
+
+    # Slow consumers drop events and are told to refetch.
+    small = EventHub(queue_size=1)
+    with small.subscribe("project:1") as slow:
+        small.publish("project:1", "report.status", {"status": "queued"})
+        small.publish("project:1", "report.status", {"status": "done"})
+        assert small.stats()["dropped"] == 1
+        assert slow.lagged is True
+
+    other = create_auth_header(client)
+    assert client.get(f"/projects/{project_id}/events", headers=other).status_code == 404
+
+
+def test_notification_dispatcher_delivers_due_rows(client: TestClient):
+    from app.jobs.channels import channels
+
+    headers = create_auth_header(client)
+    now_resp = client.post(
+        "/notifications",
+        json={"title": "Now", "message": "Deliver me", "delivery_channel": "email"},
+        headers=headers,
+    )
+    assert now_resp.status_code == 200, now_resp.text
+    later = client.post(
+        "/notifications",
+        json={"title": "Later", "message": "Not yet", "schedule_json": {"hours": 2}},
+        headers=headers,
+    ).json()
+    bogus = client.post(
+        "/notifications",
+        json={"title": "Pigeon", "message": "No such channel", "delivery_channel": "pigeon"},
+        headers=headers,
+    ).json()
+    bad = client.post(
+        "/notifications",
+        json={"title": "Bad", "message": "x", "schedule_json": {"at": "tomorrow"}},
+        headers=headers,
+    )
+    assert bad.status_code == 400
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        by_id = {n["id"]: n for n in client.get("/notifications", headers=headers).json()}
+        if by_id[now_resp.json()["id"]]["status"] == "sent" and by_id[bogus["id"]]["status"] == "failed":
+            break
+        time.sleep(0.05)
+    assert by_id[now_resp.json()["id"]]["status"] == "sent"
+    assert by_id[now_resp.json()["id"]]["sent_at"]
+    assert by_id[bogus["id"]]["status"] == "failed"
+    assert by_id[later["id"]]["status"] == "scheduled"
+    assert any(entry[0] == now_resp.json()["id"] for entry in channels["email"].sent)
+
+    # A row from before next_run_at existed is still delivered.
+    import sqlite3
+    from app.jobs.notifications import dispatcher
+
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        legacy_id = conn.execute(
+            "INSERT INTO notifications (user_id, title, message, delivery_channel, status, attempts, created_at, updated_at)"
+            " SELECT user_id, 'Legacy', 'Old row', 'push', 'scheduled', 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP"
+            " FROM notifications WHERE id = ?", (bogus["id"],)
+        ).lastrowid
+    dispatcher.notify()
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        by_id = {n["id"]: n for n in client.get("/notifications", headers=headers).json()}
+        if by_id[legacy_id]["status"] == "sent":
+            break
+        time.sleep(0.05)
+    assert by_id[legacy_id]["status"] == "sent"
+
+
+def test_notification_claim_uses_index(client: TestClient):
+    from datetime import datetime
+
+    from sqlalchemy import select
+
+    from app.models import Notification
+
+    client.get("/health")
+    stmt = (
+        select(Notification.id)
+        .where(Notification.status == "scheduled", Notification.next_run_at <= datetime(2030, 1, 1))
+        .order_by(Notification.next_run_at)
+        .limit(500)
+    )
+    plan = _query_plan(stmt)
+    assert any("ix_notifications_status_next_run" in step for step in plan), plan
+    assert not any("TEMP B-TREE" in step for step in plan), plan
+
+
+def test_optimize_matches_engine_and_returns_pareto_front(client: TestClient):
+    from app.calcs import optimize
+
+    inputs = {
+        "site": {"tilt": 20, "azimuth": 180},
+        "demand": {"annual_kwh": 9000},
+        "pv": {"panel_watts": 400, "num_panels": 10},
+        "inverter": {"ac_kw": 4.5},
+    }
+    sweep = {
+        "num_panels": {"start": 6, "stop": 20, "step": 2},
+        "panel_watts": {"start": 400, "stop": 500, "step": 50},
+        "tilt": {"start": 0, "stop": 40, "step": 10},
+        "azimuth": {"start": 150, "stop": 210, "step": 30},
+    }
+    out = optimize.optimize(inputs, sweep)
+    assert out["evaluated"] == {"sizes": 20, "orientations": 15, "candidates": 360}
+
+    # Clipped yields from the sorted-profile shortcut match the engine run per candidate.
+    for cand in out["pareto_front"]:
+        direct = solar.calculate({
+            **inputs,
+            "site": {"tilt": cand["tilt"], "azimuth": cand["azimuth"]},
+            "pv": {"panel_watts": cand["panel_watts"], "num_panels": cand["num_panels"]},
+        })
+        assert abs(direct["est_annual_kwh"] - cand["annual_kwh"]) <= 1
+    front = [(c["dc_kw"], c["annual_kwh"]) for c in out["pareto_front"]]
+    assert front == sorted(front)
+    assert all(b[1] > a[1] for a, b in zip(front, front[1:]))
+    best = out["best"]
+    assert out["meets_target"] and best["annual_kwh"] >= 9000
+    assert all(c["annual_kwh"] < 9000 for c in out["pareto_front"] if c["dc_kw"] < best["dc_kw"])
+
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Sizing"}, headers=headers).json()["id"]
+    client.post(f"/projects/{project_id}/inputs", json={"payload_json": inputs}, headers=headers)
+    resp = client.post(f"/projects/{project_id}/optimize", json=sweep, headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["best"] == best
+    too_big = {**sweep, "tilt": {"start": 0, "stop": 90, "step": 0.5}, "azimuth": {"start": 0, "stop": 359}}
+    resp = client.post(f"/projects/{project_id}/optimize", json=too_big, headers=headers)
+    assert resp.status_code == 400
+    # Oversized ranges are rejected from their bounds, before any array is built.
+    huge = {"num_panels": {"start": 1, "stop": 1e13}}
+    resp = client.post(f"/projects/{project_id}/optimize", json=huge, headers=headers)
+    assert resp.status_code == 400 and "more than" in resp.json()["detail"]
+    reversed_range = {"tilt": {"start": 40, "stop": 10}}
+    assert client.post(f"/projects/{project_id}/optimize", json=reversed_range, headers=headers).status_code == 422
+
+
+def test_delta_version_storage_and_diff(client: TestClient, monkeypatch):
+    import sqlite3
+    from app import history
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "VERSION_STORAGE", "delta")
+    monkeypatch.setattr(settings, "VERSION_SNAPSHOT_INTERVAL", 3)
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Edited often"}, headers=headers).json()["id"]
+    payloads = []
+    for idx in range(7):
+        payload = {
+            "pv": {"panel_watts": 400, "num_panels": 10 + idx},
+            "site": {"tilt": 20},
+            "tariff": {"hourly": [0.1 + h / 100 for h in range(24)]},
+            "tags": ["a"] * (idx % 2),
+        }
+        if idx >= 4:
+            payload["demand"] = {"annual_kwh": 9000}
+        payloads.append(payload)
+        resp = client.post(f"/projects/{project_id}/inputs", json={"payload_json": payload}, headers=headers)
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["version"] == idx + 1
+        assert resp.json()["payload_json"] == payload
+
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        stored = conn.execute(
+            "SELECT version, payload_json IS NOT NULL, delta_json IS NOT NULL FROM project_inputs"
+            " WHERE project_id = ? ORDER BY version", (project_id,)
+        ).fetchall()
+    assert [(v, bool(full)) for v, full, _ in stored] == [
+        (1, True), (2, False), (3, False), (4, True), (5, False), (6, False), (7, True),
+    ]
+
+    history.history_cache.clear()
+    resp = client.get(f"/projects/{project_id}/inputs/2..6/diff", headers=headers)
+    assert resp.status_code == 200, resp.text
+    patch = resp.json()["patch"]
+    assert history.apply_patch(payloads[1], patch) == payloads[5]
+    assert {"op": "add", "path": "/demand", "value": {"annual_kwh": 9000}} in patch
+    assert client.get(f"/projects/{project_id}/inputs/2..9/diff", headers=headers).status_code == 404
+
+    history.history_cache.clear()
+    resp = client.post(f"/projects/{project_id}/calculate", headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["results_json"] == series.split(solar.calculate(payloads[6]))["results_json"]
+
+
+def test_hourly_series_binary_storage(client: TestClient):
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Series"}, headers=headers).json()["id"]
+    inputs = {"pv": {"panel_watts": 450, "num_panels": 16}, "inverter": {"ac_kw": 6}}
+    client.post(f"/projects/{project_id}/inputs", json={"payload_json": inputs}, headers=headers)
+    resp = client.post(f"/projects/{project_id}/calculate", headers=headers)
+    assert resp.status_code == 200, resp.text
+    version = resp.json()["version"]
+    expected = solar.calculate(inputs)["hourly_kwh"]
+
+    url = f"/projects/{project_id}/calculations/{version}/series"
+    resp = client.get(url, headers=headers)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/octet-stream"
+    assert resp.headers["x-series-dtype"] == "float32"
+    assert resp.headers["x-series-shape"] == "8760"
+    assert np.array_equal(np.frombuffer(resp.content, dtype="<f4"), expected)
+
+    resp = client.get(url, params={"format": "json", "resolution": "monthly"}, headers=headers)
+    assert resp.status_code == 200
+    monthly = resp.json()["values"]
+    assert len(monthly) == 12
+    assert sum(monthly) == pytest.approx(float(expected.sum(dtype=np.float64)), rel=1e-4)
+    daily = client.get(url, params={"format": "json", "resolution": "daily"}, headers=headers).json()["values"]
+    assert len(daily) == 365
+    assert client.get(url, params={"format": "json"}, headers=headers).status_code == 400
+    assert client.get(f"/projects/{project_id}/calculations/99/series", headers=headers).status_code == 404
+
+    blob, encoding = series.encode(expected, "zlib")
+    assert encoding == series.ZLIB and len(blob) < expected.nbytes
+    assert np.array_equal(series.decode(blob, encoding), expected)
+
+
+def test_fast_json_list_matches_default_encoder(client: TestClient, monkeypatch):
+    from app.config import settings
+    from app.responses import FastJSONResponse
+
+    headers = create_auth_header(client)
+    for idx in range(3):
+        site = {"lat": 31.5 + idx, "lon": 34.8, "name": f"Roof ✓ {idx}", "points": [[idx, 0.5]] * 50}
+        client.post("/projects", json={"name": f"Fast {idx}", "site_location_json": site}, headers=headers)
+
+    monkeypatch.setattr(settings, "FAST_JSON", False)
+    slow = client.get("/projects", params={"limit": 2}, headers=headers)
+    monkeypatch.setattr(settings, "FAST_JSON", True)
+    fast = client.get("/projects", params={"limit": 2}, headers=headers)
+    assert fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.json() == slow.json()
+    assert fast.headers["X-Next-Cursor"] == slow.headers["X-Next-Cursor"]
+
+    body = FastJSONResponse({"values": np.arange(3, dtype=np.float32), 1: "x"}).body
+    assert json.loads(body) == {"values": [0.0, 1.0, 2.0], "1": "x"}
+
+
+def test_list_etag_short_circuits_to_304(client: TestClient):
+    from sqlalchemy import event
+
+    from app.db import engine
+
+    headers = create_auth_header(client)
+    other = create_auth_header(client)
+    for idx in range(2):
+        client.post("/projects", json={"name": f"Polled {idx}"}, headers=headers)
+
+    first = client.get("/projects", headers=headers)
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        resp = client.get("/projects", headers={**headers, "If-None-Match": etag})
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["ETag"] == etag
+    project_reads = [s for s in statements if "FROM projects" in s]
+    assert len(project_reads) == 1 and "count(" in project_reads[0]
+
+    assert client.get("/projects", params={"limit": 1}, headers={**headers, "If-None-Match": etag}).status_code == 200
+    assert client.get("/projects", headers={**other, "If-None-Match": etag}).status_code == 200
+    client.post("/projects", json={"name": "Polled 2"}, headers=headers)
+    changed = client.get("/projects", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert len(changed.json()) == 3
+
+
+def test_list_etag_changes_on_same_second_updates(client: TestClient):
+    import asyncio
+
+    from sqlalchemy import select, update
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from app.models import Notification
+
+    headers = create_auth_header(client)
+    created = client.post(
+        "/notifications", json={"title": "Polled", "message": "x", "schedule_json": {"hours": 2}}, headers=headers,
+    ).json()
+
+    async def run(stmt, params=None):
+        engine = create_async_engine(TEST_DB_URL)
+        try:
+            async with AsyncSession(engine) as session:
+                await session.execute(stmt, params)
+                await session.commit()
+                return await session.scalar(select(Notification.row_version).where(Notification.id == created["id"]))
+        finally:
+            await engine.dispose()
+
+    # The statement shapes the dispatcher uses: a claim, then a bulk update by primary key.
+    steps = [
+        (update(Notification).where(Notification.id == created["id"]).values(status="sending"), None),
+        (update(Notification), [{"id": created["id"], "status": "sent"}]),
+    ]
+    etag = client.get("/notifications", headers=headers).headers["ETag"]
+    for expected_version, (stmt, params) in enumerate(steps, start=2):
+        assert asyncio.run(run(stmt, params)) == expected_version
+        resp = client.get("/notifications", headers={**headers, "If-None-Match": etag})
+        assert resp.status_code == 200
+        assert resp.headers["ETag"] != etag
+        etag = resp.headers["ETag"]
+    assert resp.json()[0]["status"] == "sent"
+
+
+def test_stripe_webhook_deduplicates_and_applies_in_background(client: TestClient):
+    import sqlite3
+
+    headers = create_auth_header(client, activate=False)
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    session_id = client.post(
+        "/payments/checkout", json={"provider": "stripe"}, headers=headers
+    ).json()["session_id"]
+    event_id = f"evt_{uuid4().hex}"
+    before = client.get("/metrics/jobs", headers=METRICS_HEADERS).json()["stripe_events"]
+
+    first = trigger_stripe_completion(client, user_id=user_id, session_id=session_id, event_id=event_id)
+    assert first == {"received": True, "duplicate": False}
+    for _ in range(3):
+        retry = trigger_stripe_completion(client, user_id=user_id, session_id=session_id, event_id=event_id)
+        assert retry["duplicate"] is True
+    wait_until_active(client, headers)
+
+    after = client.get("/metrics/jobs", headers=METRICS_HEADERS).json()["stripe_events"]
+    assert after["received"] - before["received"] == 1
+    assert after["duplicates"] - before["duplicates"] == 3
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        status, attempts = conn.execute(
+            "SELECT status, attempts FROM stripe_events WHERE id = ?", (event_id,)
+        ).fetchone()
+        payments = conn.execute(
+            "SELECT status FROM payments WHERE external_id = ?", (session_id,)
+        ).fetchall()
+    assert (status, attempts) == ("processed", 1)
+    assert payments == [("paid",)]
+
+
+def test_request_metrics_and_server_timing(client: TestClient):
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Timed"}, headers=headers).json()["id"]
+    resp = client.get(f"/projects/{project_id}/visualizations", headers=headers)
+    assert resp.status_code == 200
+    timing = resp.headers["Server-Timing"]
+    assert timing.startswith("app;dur=")
+    # Owner check, ETag aggregate and the page query (auth is served from cache).
+    assert 'db;dur=' in timing and '"3 queries"' in timing
+
+    text = client.get("/metrics", headers=METRICS_HEADERS).text
+    route = 'method="GET",route="/projects/{project_id}/visualizations"'
+    assert f'http_request_duration_seconds_count{{{route},status="200"}}' in text
+    assert f'http_request_duration_seconds_bucket{{{route},status="200",le="+Inf"}}' in text
+    assert f'db_queries_per_request_bucket{{{route},le="3.0"}}' in text
+    assert f"/projects/{project_id}/" not in text
+    client.get("/no/such/path")
+    assert 'route="<unmatched>"' in client.get("/metrics", headers=METRICS_HEADERS).text
+
+    # Scrapers use METRICS_TOKEN; otherwise only admins get in.
+    import sqlite3
+    from app.deps import invalidate_user
+
+    assert client.get("/metrics/db").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics/jobs", headers=headers).status_code == 403
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        conn.execute("UPDATE users SET role = 'admin' WHERE id = ?", (user_id,))
+    invalidate_user(user_id)
+    assert client.get("/metrics/jobs", headers=headers).status_code == 200
+
+
+def test_resource_store_backs_engine_once_per_cell():
+    from app.calcs import memo, resource
+
+    lat, lon = 40.41, -3.70
+    inputs = {"site": {"lat": lat, "lon": lon}, "pv": {"panel_watts": 450, "num_panels": 12}}
+    clear_sky = solar.calculate(inputs)
+    key_clear_sky = memo.inputs_hash(inputs)
+
+    data = resource.synthetic_year(lat, lon, seed=7)
+    assert data.shape == (4, 8760) and data.dtype == np.dtype("<f4")
+    assert np.array_equal(data, resource.synthetic_year(lat, lon, seed=7))
+    path = resource.store.write(lat, lon, data)
+    try:
+        loads = resource.store.loads
+        # Three projects in the same 0.25 deg cell share one mapped file.
+        batch = [{**inputs, "site": {"lat": lat + d, "lon": lon + d}} for d in (0.0, 0.01, 0.02)]
+        results = solar.calculate_many(batch)
+        assert resource.store.loads == loads + 1
+        assert isinstance(resource.store.get(lat, lon).data, np.memmap)
+        assert results[0]["est_annual_kwh"] != clear_sky["est_annual_kwh"]
+        assert results[0]["hourly_kwh"][0] == 0
+        assert memo.inputs_hash(inputs) != key_clear_sky
+    finally:
+        path.unlink()
+        resource.store.clear()
+    assert memo.inputs_hash(inputs) == key_clear_sky
+    assert solar.calculate(inputs)["est_annual_kwh"] == clear_sky["est_annual_kwh"]
+
+
+def test_sun_tables_built_once_then_memory_mapped(tmp_path, monkeypatch):
+    from app.calcs.sun_tables import SunTableStore
+
+    store = SunTableStore(str(tmp_path), 0.01, 8, solar._build_sun_table, solar.ENGINE_VERSION)
+    table = store.get(47.123)
+    assert store.builds == 1 and table.lat == pytest.approx(47.12)
+    assert store.get(47.1249) is table
+    assert np.allclose(table.cos_z, solar._sun_geometry(47.12)[0])
+
+    # Another worker maps the saved file instead of rebuilding it.
+    other = SunTableStore(str(tmp_path), 0.01, 8, solar._build_sun_table, solar.ENGINE_VERSION)
+    mapped = other.get(47.12)
+    assert other.builds == 0 and other.maps == 1
+    assert isinstance(mapped.data, np.memmap)
+    assert np.array_equal(mapped.data, table.data)
+
+    inputs = {"site": {"lat": 47.12, "lon": 8.5}, "pv": {"panel_watts": 400, "num_panels": 10}}
+    expected = solar.calculate(inputs)
+
+    def no_trig(*args, **kwargs):
+        raise AssertionError("hot path recomputed sun geometry")
+
+    monkeypatch.setattr(solar, "_sun_geometry", no_trig)
+    monkeypatch.setattr(solar, "_clear_sky", no_trig)
+    assert solar.calculate(inputs)["est_annual_kwh"] == expected["est_annual_kwh"]
+
+
+def test_export_streams_calculations_with_flattened_columns(client: TestClient, monkeypatch):
+    import csv
+    import io
+    from app import history
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "VERSION_STORAGE", "delta")
+    monkeypatch.setattr(settings, "VERSION_SNAPSHOT_INTERVAL", 3)
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Exported"}, headers=headers).json()["id"]
+    expected = []
+    for idx in range(4):
+        payload = {
+            "site": {"lat": 32.1, "lon": 34.8, "tilt": 20 + idx, "azimuth": 180},
+            "pv": {"panel_watts": 400, "num_panels": 10 + idx, "losses_pct": 14},
+            "tariff": {"hourly": [0.1 + h / 100 for h in range(24)]},
+        }
+        assert client.post(f"/projects/{project_id}/inputs", json={"payload_json": payload}, headers=headers).status_code == 200
+        if idx == 1:
+            continue  # inputs v2 is never calculated
+        resp = client.post(f"/projects/{project_id}/calculate", headers=headers)
+        assert resp.status_code == 200, resp.text
+        expected.append((idx + 1, payload, resp.json()["results_json"]))
+    other = create_auth_header(client)
+    other_id = client.post("/projects", json={"name": "Not mine"}, headers=other).json()["id"]
+    client.post(f"/projects/{other_id}/inputs", json={"payload_json": {"pv": {"num_panels": 3}}}, headers=other)
+    client.post(f"/projects/{other_id}/calculate", headers=other)
+
+    history.history_cache.clear()
+    resp = client.get("/projects/export", headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert 'filename="calculations.csv"' in resp.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert [int(r["project_id"]) for r in rows] == [project_id] * 3
+    for row, (inputs_version, payload, results) in zip(rows, expected):
+        assert int(row["inputs_version"]) == inputs_version
+        assert float(row["num_panels"]) == payload["pv"]["num_panels"]
+        assert float(row["tilt"]) == payload["site"]["tilt"]
+        assert float(row["est_annual_kwh"]) == results["est_annual_kwh"]
+        assert [float(row[f"monthly_kwh_{m:02d}"]) for m in range(1, 13)] == results["monthly_kwh"]
+    assert [int(r["calculation_version"]) for r in rows] == [1, 2, 3]
+
+    one = client.get("/projects/export", params={"project_id": other_id}, headers=headers)
+    assert list(csv.DictReader(io.StringIO(one.text))) == []
+    assert client.get("/projects/export", params={"scope": "org"}, headers=headers).status_code == 400
+
+    # Organization scope: members only see their own history; admins see everyone's.
+    import sqlite3
+    import jwt
+    from app.deps import invalidate_user
+
+    admin, member = create_auth_header(client), create_auth_header(client)
+    ids = {name: int(jwt.decode(h["Authorization"].split()[1], options={"verify_signature": False})["sub"])
+           for name, h in (("admin", admin), ("member", member))}
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        org_id = conn.execute("INSERT INTO orgs (name) VALUES (?)", (f"org-{uuid4().hex}",)).lastrowid
+        conn.execute("UPDATE users SET org_id = ? WHERE id IN (?, ?)", (org_id, ids["admin"], ids["member"]))
+        conn.execute("UPDATE users SET role = 'admin' WHERE id = ?", (ids["admin"],))
+    for user_id in ids.values():
+        invalidate_user(user_id)
+    member_project = client.post("/projects", json={"name": "Member site"}, headers=member).json()["id"]
+    client.post(f"/projects/{member_project}/inputs", json={"payload_json": {"pv": {"num_panels": 4}}}, headers=member)
+    client.post(f"/projects/{member_project}/calculate", headers=member)
+    assert client.get("/projects/export", params={"scope": "org"}, headers=member).status_code == 403
+    resp = client.get("/projects/export", params={"scope": "org"}, headers=admin)
+    assert resp.status_code == 200, resp.text
+    assert [int(r["project_id"]) for r in csv.DictReader(io.StringIO(resp.text))] == [member_project]
+
+
+def test_export_parquet_round_trips(client: TestClient, monkeypatch):
+    import io
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    from app.config import settings
+    from app.export import COLUMNS
+
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+    headers = create_auth_header(client)
+    project_id = client.post("/projects", json={"name": "Parquet"}, headers=headers).json()["id"]
+    results = []
+    for num_panels in (6, 7, 8):
+        inputs = {"site": {"lat": 32.1, "lon": 34.8}, "pv": {"panel_watts": "", "num_panels": num_panels}}
+        client.post(f"/projects/{project_id}/inputs", json={"payload_json": inputs}, headers=headers)
+        results.append(client.post(f"/projects/{project_id}/calculate", headers=headers).json()["results_json"])
+
+    resp = client.get("/projects/export", params={"format": "parquet"}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert 'filename="calculations.parquet"' in resp.headers["content-disposition"]
+    parquet = pq.ParquetFile(io.BytesIO(resp.content))
+    assert parquet.schema_arrow.names == list(COLUMNS)
+    assert parquet.metadata.num_row_groups == 2  # one per fetched batch
+    rows = parquet.read().to_pylist()
+    assert [r["calculation_version"] for r in rows] == [1, 2, 3]
+    assert [r["num_panels"] for r in rows] == [6.0, 7.0, 8.0]
+    assert [r["panel_watts"] for r in rows] == [None] * 3  # non-numeric inputs export as null
+    assert [r["est_annual_kwh"] for r in rows] == [r["est_annual_kwh"] for r in results]
+    assert [rows[0][f"monthly_kwh_{m:02d}"] for m in range(1, 13)] == results[0]["monthly_kwh"]
+
+
+def test_import_projects_from_csv_in_batches(client: TestClient, monkeypatch):
+    import sqlite3
+    from app.config import settings
+
+    monkeypatch.setattr(settings, "IMPORT_BATCH_SIZE", 2)
+    headers = create_auth_header(client)
+    sheet = (
+        "\ufeffName,Currency,Lat,Lon,Tilt,Azimuth,Panel Watts,Num Panels,Losses Pct,Notes\n"
+        "Site A,EUR,32.1,34.8,25,180,550,10,14,first\n"
+        "Site B,,31.5,35.0,,,450,8,,\n"
+        ",USD,32,34,25,180,550,10,14,missing name\n"
+        "\n"
+        "Site C,USD,95,34,25,180,550,ten,14,\n"
+        "Site D,USD,30.0,31.0,20,170,400,12,12,\n"
+    )
+    resp = client.post(
+        "/projects/import",
+        params={"calculate": "true"},
+        files={"file": ("sites.csv", sheet.encode(), "text/csv")},
+        headers=headers,
+    )
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["imported"] == 3 and body["calculation_queued"] is True
+    assert [e["row"] for e in body["errors"]] == [4, 6]
+    assert "name" in body["errors"][0]["detail"]
+    assert "lat" in body["errors"][1]["detail"] and "num_panels" in body["errors"][1]["detail"]
+
+    project_ids = body["project_ids"]
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        projects = conn.execute(
+            f"SELECT name, currency FROM projects WHERE id IN ({','.join('?' * 3)}) ORDER BY id", project_ids
+        ).fetchall()
+        inputs = json.loads(conn.execute(
+            "SELECT payload_json FROM project_inputs WHERE project_id = ? AND version = 1", (project_ids[1],)
+        ).fetchone()[0])
+        calculated = conn.execute(
+            f"SELECT COUNT(*) FROM calculations WHERE project_id IN ({','.join('?' * 3)}) AND inputs_version = 1",
+            project_ids,
+        ).fetchone()[0]
+    assert projects == [("Site A", "EUR"), ("Site B", "USD"), ("Site D", "USD")]
+    assert inputs == {"site": {"lat": 31.5, "lon": 35.0}, "pv": {"panel_watts": 450.0, "num_panels": 8}}
+    assert calculated == 3
+
+    # An export of the imported projects reads back as an import sheet.
+    exported = client.get("/projects/export", params={"project_id": project_ids[0]}, headers=headers)
+    again = client.post("/projects/import", files={"file": ("again.csv", exported.content, "text/csv")}, headers=headers)
+    assert again.json()["imported"] == 1 and again.json()["errors"] == []
+
+    resp = client.post("/projects/import", files={"file": ("bad.csv", b"\xff\xfename\n", "text/csv")}, headers=headers)
+    assert resp.status_code == 400
+
+    # Unreadable part way through: committed batches are reported, not hidden behind a 400.
+    good = "".join(f"Row {i},USD,32,34\n" for i in range(300)).encode()
+    resp = client.post(
+        "/projects/import",
+        files={"file": ("partial.csv", b"name,currency,lat,lon\n" + good + b"Bad \xff,USD,1,1\n", "text/csv")},
+        headers=headers,
+    )
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert 0 < body["imported"] <= 300
+    assert "Could not read the file" in body["errors"][-1]["detail"]
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        stored = conn.execute(
+            "SELECT COUNT(*) FROM projects WHERE name LIKE 'Row %' AND owner_id = "
+            "(SELECT owner_id FROM projects WHERE id = ?)", (body["project_ids"][0],)
+        ).fetchone()[0]
+    assert stored == body["imported"]
+
+
+def test_import_projects_from_xlsx(client: TestClient):
+    import io
+    import sqlite3
+
+    openpyxl = pytest.importorskip("openpyxl")
+
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Name", "Currency", "Lat", "Lon", "Panel Watts", "Num Panels"])
+    sheet.append(["Roof", "EUR", 32.1, 34.8, 550, 10])
+    sheet.append([None, None, None, None, None, None])
+    sheet.append(["Shed", "USD", 95, 34, 400, "ten"])
+    sheet.append(["Barn", None, 31.5, 35.0, 450, 8])
+    upload = io.BytesIO()
+    workbook.save(upload)
+
+    headers = create_auth_header(client)
+    resp = client.post(
+        "/projects/import",
+        files={"file": ("sites.xlsx", upload.getvalue(), "application/octet-stream")},
+        headers=headers,
+    )
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["imported"] == 2
+    assert [e["row"] for e in body["errors"]] == [4]
+    with sqlite3.connect(TEST_DB_PATH) as conn:
+        payloads = [json.loads(row[0]) for row in conn.execute(
+            f"SELECT payload_json FROM project_inputs WHERE project_id IN ({','.join('?' * 2)}) ORDER BY project_id",
+            body["project_ids"],
+        )]
+    assert payloads == [
+        {"site": {"lat": 32.1, "lon": 34.8}, "pv": {"panel_watts": 550, "num_panels": 10}},
+        {"site": {"lat": 31.5, "lon": 35.0}, "pv": {"panel_watts": 450, "num_panels": 8}},
+    ]
+
+    resp = client.post("/projects/import", files={"file": ("junk.xlsx", b"not a workbook", "application/octet-stream")}, headers=headers)
+    assert resp.status_code == 400